@@ -0,0 +1,68 @@
+"""
+Measures "nextbike transform" when all outputs exist already, so every stage is skipped, against the inputs the
+Preprocessor formerly loaded eagerly in that case (the raw pings and the postcode polygons).
+
+The command runs in a subprocess, so interpreter start-up and imports are included. Exits with 1 if the cached run
+exceeds --budget seconds.
+
+Usage: python -m benchmarks.bench_cached_run [--size 1000000] [--budget 1.0]
+"""
+import argparse
+import contextlib
+import io as stdio
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+from benchmarks.run import REPOSITORY, make_workdir
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--budget', type=float, default=1.0)
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    workdir = make_workdir(args.size, seed=0)
+    os.chdir(workdir)
+    try:
+        import geopandas as gpd
+        from nextbike import io
+        from nextbike.preprocessing.Preprocessor import Preprocessor
+
+        with contextlib.redirect_stdout(stdio.StringIO()):
+            Preprocessor('bench.csv').run()
+
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join([REPOSITORY, os.environ.get('PYTHONPATH', '')]))
+        cached = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            result = subprocess.run([sys.executable, '-m', 'nextbike.cli', 'transform', 'bench.csv'], env=env,
+                                    stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+            cached.append(time.perf_counter() - started)
+            if result.returncode != 0 or '(run)' in result.stdout:
+                print(result.stdout)
+                sys.exit(1)
+
+        started = time.perf_counter()
+        io.read_file(path=os.path.join('data', 'raw', 'bench.csv'), datetime_cols=['datetime'])
+        gpd.read_file(os.path.join('data', 'external', 'plz_bremen.geojson'))
+        eager = time.perf_counter() - started
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+
+    print('{} pings'.format(args.size))
+    print('  cached transform        {:7.3f}s'.format(min(cached)))
+    print('  former eager loading    {:7.3f}s (on top of the cached transform)'.format(eager))
+    if min(cached) > args.budget:
+        print('  exceeds the budget of {:.3f}s'.format(args.budget))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
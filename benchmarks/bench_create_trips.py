@@ -0,0 +1,97 @@
+"""
+Benchmarks the vectorized trip reconstruction against the former iterrows loop of Preprocessor.create_trips.
+
+Usage: python -m benchmarks.bench_create_trips [--sizes 1000000 10000000] [--reference-max 200000] [--workers 4 8]
+
+The reference loop is only run up to --reference-max rows, where both outputs are checked for equality. For every
+number of --workers, the sharded multi-process build is timed and checked against the single-process output. It can
+only be faster with at least as many free CPUs as workers.
+"""
+import argparse
+import datetime
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import make_cleaned_pings
+from nextbike.model import parallel
+from nextbike.preprocessing.trips import build_trips, build_trips_parallel
+
+
+def create_trips_iterrows(cleaned):
+    """The trip building loop as it was implemented in Preprocessor.create_trips."""
+    trips = []
+
+    def write_trip(ping, buffer):
+        trips.append({'bike': ping['b_number'],
+                      'bike_type': ping['b_bike_type'],
+                      'identification': ping['p_uid'],
+                      'start_time': buffer['datetime'],
+                      'end_time': ping['datetime'],
+                      'weekend': (0 if (buffer['datetime'].weekday() < 5) else 1),
+                      'duration_sec': (ping['datetime'] - buffer['datetime']).total_seconds(),
+                      'start_lng': buffer['p_lng'],
+                      'start_lat': buffer['p_lat'],
+                      'end_lng': ping['p_lng'],
+                      'end_lat': ping['p_lat'],
+                      'start_place': buffer['p_number'],
+                      'end_place': ping['p_number'],
+                      'start_plz': buffer['plz'],
+                      'end_plz': ping['plz']
+                      })
+
+    ordered = cleaned.sort_values(['b_number', 'datetime'], axis=0)
+    buffer = None
+    for index, ping in ordered.iterrows():
+        if buffer is not None:
+            if ping['b_number'] != buffer['b_number']:
+                buffer = ping
+                continue
+            if ping['trip'] == 'first' and buffer['trip'] == 'last':
+                if buffer['datetime'].time() != datetime.time(23, 59) and ping['datetime'].time() != datetime.time(0, 0):
+                    if (ping['p_lat'] != buffer['p_lat']) | (ping['p_lng'] != buffer['p_lng']):
+                        write_trip(ping, buffer)
+            elif ping['trip'] == 'end' and buffer['trip'] == 'start':
+                write_trip(ping, buffer)
+            buffer = ping
+        elif ping['trip'] == 'last' or ping['trip'] == 'start':
+            buffer = ping
+
+    return pd.DataFrame.from_records(trips)
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000, 10000000])
+    parser.add_argument('--reference-max', type=int, default=100000)
+    parser.add_argument('--workers', type=int, nargs='*', default=[])
+    args = parser.parse_args()
+
+    if args.workers:
+        print('{} CPUs available'.format(parallel.available_cpus()))
+    for size in args.sizes:
+        pings = make_cleaned_pings(size)
+        trips, vectorized = timed(build_trips, pings)
+        line = '{:>10} pings {:>9} trips  vectorized {:8.3f}s'.format(len(pings), len(trips), vectorized)
+
+        if size <= args.reference_max:
+            reference, loop = timed(create_trips_iterrows, pings)
+            pd.testing.assert_frame_equal(trips, reference)
+            line += '  iterrows {:8.3f}s  speedup {:7.1f}x  (outputs equal)'.format(loop, loop / vectorized)
+
+        for workers in args.workers:
+            sharded, sharded_seconds = timed(build_trips_parallel, pings, workers)
+            pd.testing.assert_frame_equal(sharded, trips)
+            line += '  {} workers {:8.3f}s ({:.1f}x)'.format(workers, sharded_seconds, vectorized / sharded_seconds)
+
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmarks the demand features of all resolutions rolled up from the hourly demand cube against resampling the trips
+once per resolution, as Model.train_demand did, and the incremental update of the cube against a rebuild.
+
+Usage: python -m benchmarks.bench_demand_cube [--sizes 100000 1000000] [--batch 0.01]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import make_trips
+from nextbike.model.DemandCube import DemandCube
+from nextbike.model.features import DEMAND_DEGREES
+
+AGGREGATION = {'number_bookings': 'count', 'month': 'mean', 'hour': 'mean', 'temp_2m': 'mean', 'min': 'mean'}
+
+
+def resample(trips, resolution):
+    """The demand per time bucket as it was computed from the trips for every resolution."""
+    trips = trips.copy()
+    trips['month'] = trips['start_time'].dt.month
+    trips['booking_date'] = trips['start_time'].dt.date
+    trips['weekdays'] = trips['start_time'].dt.weekday
+    trips['hour'] = trips['start_time'].dt.hour
+    trips['number_bookings'] = 1
+    return trips.resample(resolution, on='start_time').agg(AGGREGATION).dropna()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--batch', type=float, default=0.01, help='share of trips added incrementally')
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        trips = make_trips(size)[['start_time', 'temp_2m', 'min']]
+        resolutions = list(DEMAND_DEGREES)
+
+        started = time.perf_counter()
+        expected = {resolution: resample(trips, resolution) for resolution in resolutions}
+        resampled = time.perf_counter() - started
+
+        started = time.perf_counter()
+        cube = DemandCube.from_trips(trips)
+        views = {resolution: cube.view(resolution) for resolution in resolutions}
+        rolled = time.perf_counter() - started
+
+        for resolution in resolutions:
+            pd.testing.assert_frame_equal(views[resolution], expected[resolution], check_dtype=False,
+                                          check_freq=False, rtol=1e-9)
+
+        # the newest trips arrive as a batch
+        split = int(size * (1 - args.batch))
+        cube = DemandCube.from_trips(trips.iloc[:split])
+        started = time.perf_counter()
+        cube.update(trips.iloc[split:])
+        updated = time.perf_counter() - started
+
+        started = time.perf_counter()
+        rebuilt = DemandCube.from_trips(trips)
+        rebuild = time.perf_counter() - started
+        np.testing.assert_allclose(cube.cube.to_numpy(), rebuilt.cube.to_numpy(), rtol=1e-9)
+
+        print('{:>9} trips  4 resolutions: resample {:7.3f}s  cube + roll-up {:7.3f}s  speedup {:5.1f}x  '
+              '| {:.0%} new trips: update {:7.3f}s  rebuild {:7.3f}s  (outputs equal)'.format(
+                size, resampled, rolled, resampled / rolled, args.batch, updated, rebuild))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""
+Benchmarks the vectorized haversine kernel against the scalar Model.distanceToUni/distanceToMainStation path.
+
+Usage: python -m benchmarks.bench_direction_features [--trips 1000000]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_trips
+from nextbike.model.features import distance_towards, UNIVERSITY, MAIN_STATION
+from nextbike.model.Model import Model
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--trips', type=int, default=1000000)
+    args = parser.parse_args()
+
+    trips = make_trips(args.trips)
+    model = Model.__new__(Model)
+
+    started = time.perf_counter()
+    scalar = np.array([[model.distanceToUni(*row), model.distanceToMainStation(*row)]
+                       for row in zip(trips['start_lng'], trips['start_lat'], trips['end_lng'], trips['end_lat'])])
+    scalar_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    vectorized = distance_towards(trips, [UNIVERSITY, MAIN_STATION])
+    vectorized_time = time.perf_counter() - started
+
+    np.testing.assert_allclose(vectorized, scalar, rtol=0, atol=1e-9)
+
+    print('{} trips x 2 pois  scalar {:.3f}s  vectorized {:.3f}s  speedup {:.1f}x'.format(
+        len(trips), scalar_time, vectorized_time, scalar_time / vectorized_time))
+
+
+if __name__ == '__main__':
+    main()
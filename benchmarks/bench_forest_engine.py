@@ -0,0 +1,98 @@
+"""
+Benchmarks CompiledForest against the sklearn forests it is converted from, for batch sizes from single trips up to
+10M, and checks that both predict identical values.
+
+The duration and direction forests are trained with the hyperparameters of Model on synthetic trips. Batches are
+drawn from synthetic trips with replacement. Loading numba (and compiling the traversal on the very first run) is
+measured once and not included in the batch timings.
+
+Usage: python -m benchmarks.bench_forest_engine [--batch-sizes 1 10 100 ... 10000000] [--repeat 20]
+"""
+import argparse
+import contextlib
+import io as stdio
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_trips
+from nextbike import io
+from nextbike.model import parallel
+from nextbike.model.CompiledForest import CompiledForest, _compiled_traverse
+from nextbike.model.Model import Model
+
+MODELS = [('duration', 'train_duration', '_duration_features'),
+          ('direction_uni', 'train_direction_uni', '_direction_uni_features')]
+
+
+def measure(function, repeat):
+    """Returns the result of function and its median wall time over repeat calls."""
+    seconds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        seconds.append(time.perf_counter() - started)
+    return result, np.median(seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--batch-sizes', type=int, nargs='+',
+                        default=[1, 10, 100, 1000, 10000, 100000, 1000000, 10000000])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--train-trips', type=int, default=50000)
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix='nextbike-bench-')
+    os.chdir(workdir)
+    try:
+        for path in ['models', 'data/processed', 'data/predicted']:
+            os.makedirs(path)
+        trips = make_trips(args.train_trips)
+        model = Model()
+
+        started = time.perf_counter()
+        compiled = _compiled_traverse() is not None
+        print('numba {}'.format('loaded in {:.3f}s'.format(time.perf_counter() - started) if compiled
+                                else 'not installed, large batches are predicted by sklearn'))
+
+        rng = np.random.default_rng(0)
+        for name, train, features in MODELS:
+            with contextlib.redirect_stdout(stdio.StringIO()):
+                getattr(Model(), train)(trips=trips)
+            forest = io.read_model('model_' + name)
+            forest.n_jobs = parallel.get_jobs()
+            engine = CompiledForest(forest, n_jobs=parallel.get_jobs())
+            X = getattr(model, features)(trips.copy())
+
+            if compiled:
+                # the first compiled traversal loads the compiled code from the cache or compiles it
+                started = time.perf_counter()
+                engine.predict(X.head(engine.compiled_rows))
+                print('{:<14} first compiled traversal {:.3f}s'.format(name, time.perf_counter() - started))
+
+            for batch_size in args.batch_sizes:
+                batch = X.iloc[rng.integers(0, len(X), batch_size)]
+                # large batches are measured once
+                repeat = max(1, min(args.repeat, 100000 // batch_size))
+                expected, seconds_sklearn = measure(lambda: forest.predict(batch), repeat)
+                actual, seconds_engine = measure(lambda: engine.predict(batch), repeat)
+                np.testing.assert_array_equal(actual, expected)
+                if engine.classes_ is not None:
+                    np.testing.assert_array_equal(engine.predict_proba(batch), forest.predict_proba(batch))
+
+                path = 'numpy' if batch_size < engine.compiled_rows else 'numba' if compiled else 'sklearn'
+                print('{:<14} batch {:>8}  sklearn {:10.4f}s  engine ({:<7}) {:10.4f}s  {:6.1f}x'.format(
+                    name, batch_size, seconds_sklearn, path, seconds_engine, seconds_sklearn / seconds_engine),
+                    flush=True)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
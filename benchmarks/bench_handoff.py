@@ -0,0 +1,73 @@
+"""
+Measures a full transform (Preprocessor.run) end to end with the stages handing their output over in memory, with and
+without checkpoints, against the former hand-over through the intermediate datasets on disk.
+
+The disk hand-over is reproduced by dropping the in-memory output of every stage, so the next stage reads it from
+the intermediate dataset again. All variants have to produce identical processed datasets.
+
+Usage: python -m benchmarks.bench_handoff [--sizes 1000000 5000000] [--format csv]
+"""
+import argparse
+import contextlib
+import io as stdio
+import os
+import shutil
+import time
+
+import pandas as pd
+
+from benchmarks.run import make_workdir
+from nextbike import io
+from nextbike.preprocessing.Preprocessor import Preprocessor
+
+
+def run_from_disk(preprocessor):
+    """Preprocessor.run with every stage reading the output of the stage before from disk."""
+    preprocessor.clean_dataset()
+    preprocessor._raw = preprocessor._cleaned = None
+    preprocessor.create_trips()
+    preprocessor._trips = None
+    preprocessor.prepWeather()
+    preprocessor.mergeWeatherTrips(preprocessor._get_trips(), preprocessor._get_weather())
+
+
+VARIANTS = {
+    'disk hand-over': (True, run_from_disk),
+    'in memory': (True, Preprocessor.run),
+    'no checkpoints': (False, Preprocessor.run)
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000000, 5000000])
+    parser.add_argument('--format', default='csv')
+    args = parser.parse_args()
+    io.set_format(args.format)
+
+    cwd = os.getcwd()
+    for size in args.sizes:
+        workdir = make_workdir(size, seed=0)
+        os.chdir(workdir)
+        try:
+            outputs = {}
+            for name, (checkpoints, run) in VARIANTS.items():
+                for file in os.listdir(os.path.join('data', 'processed')):
+                    os.remove(os.path.join('data', 'processed', file))
+                started = time.perf_counter()
+                with contextlib.redirect_stdout(stdio.StringIO()):
+                    run(Preprocessor('bench.csv', checkpoints=checkpoints))
+                seconds = time.perf_counter() - started
+                outputs[name] = io.read_file(path=io.with_format(os.path.join('data', 'processed', 'bench')),
+                                             datetime_cols=['start_time', 'end_time'])
+                print('{:>10} pings  {:<16} {:8.3f}s'.format(size, name, seconds), flush=True)
+
+            for name, output in outputs.items():
+                pd.testing.assert_frame_equal(output, outputs['disk hand-over'])
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
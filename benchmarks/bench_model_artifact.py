@@ -0,0 +1,93 @@
+"""
+Benchmarks load time and memory of the model artifacts (metadata header and pickled estimator) against the plain
+pickles written by former versions.
+
+Forests with the hyperparameters of the duration and direction models are trained on synthetic trips in a temporary
+working directory. Every load runs in a fresh interpreter, which reports load time, the time to read only the header
+and the growth of its resident memory.
+
+Usage: python -m benchmarks.bench_model_artifact [--train-trips 200000] [--repeat 5]
+"""
+import argparse
+import contextlib
+import io as stdio
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+from benchmarks.synthetic import make_trips
+from nextbike import io
+from nextbike.model.Model import Model
+
+# Runs in a fresh interpreter, modules are imported before the clock starts.
+LOAD = """
+import json, os, pickle, sys, time
+sys.path[:0] = {path!r}
+import sklearn.ensemble
+from nextbike import io
+
+def rss():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+before = rss()
+started = time.perf_counter()
+if {legacy!r}:
+    with open('models/{name}.pkl', 'rb') as f:
+        model = pickle.load(f)
+    header = 0
+else:
+    model = io.read_model('{name}')
+    header = time.perf_counter()
+    io.read_model_header('{name}')
+    header = time.perf_counter() - header
+elapsed = time.perf_counter() - started - header
+print(json.dumps({{'seconds': elapsed, 'header_seconds': header, 'rss': rss() - before}}))
+"""
+
+
+def measure(name, legacy, repeat):
+    results = []
+    for _ in range(repeat):
+        code = LOAD.format(path=sys.path, name=name, legacy=legacy)
+        output = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, universal_newlines=True,
+                                check=True).stdout
+        results.append(json.loads(output.splitlines()[-1]))
+    return [np.median([result[key] for result in results]) for key in ['seconds', 'header_seconds', 'rss']]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--train-trips', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp())
+    os.makedirs('data')
+    os.makedirs('models')
+
+    trips = make_trips(args.train_trips)
+    with contextlib.redirect_stdout(stdio.StringIO()):
+        Model().train_duration(trips=trips)
+        Model().train_direction_uni(trips=trips)
+
+    for name in ['model_duration', 'model_direction_uni']:
+        # protocol 3 is the default of the python 3.6 environment the former pickles were written with
+        with open(os.path.join('models', name + '.pkl'), 'wb') as f:
+            pickle.dump(io.read_model(name), f, protocol=3)
+
+        for kind, extension, legacy in [('pickle', '.pkl', True), ('artifact', '.model', False)]:
+            size = os.path.getsize(os.path.join('models', name + extension)) / 2 ** 20
+            seconds, header, rss = measure(name, legacy, args.repeat)
+            print('{:<20} {:<9} {:6.2f}MB on disk  load {:7.2f}ms  header {:5.2f}ms  RSS +{:6.2f}MB'.format(
+                name, kind, size, seconds * 1000, header * 1000, rss / 2 ** 20))
+        print('{:<20} header: {}'.format(name, json.dumps(io.read_model_header(name))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Benchmarks the PLZ assignment of PlzLookup against the former geopandas sjoin of Preprocessor.clean_dataset.
+
+Usage: python -m benchmarks.bench_plz_lookup [--sizes 100000 1000000] [--spots 5000]
+"""
+import argparse
+import os
+import time
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import LAT_MAX, LAT_MIN, LNG_MAX, LNG_MIN
+from nextbike.preprocessing.PlzLookup import PlzLookup
+
+
+def sjoin_plz(pings, plz_df):
+    """The postcode assignment as it was implemented in Preprocessor.clean_dataset."""
+    points = gpd.GeoDataFrame(pings, geometry=gpd.points_from_xy(pings.p_lng.copy(), pings.p_lat.copy()))
+    points.crs = plz_df.crs
+    joined = gpd.sjoin(points, plz_df[['geometry', 'plz']], how='left', predicate='within')
+    joined = joined[~joined.index.duplicated(keep='first')]
+    return pd.to_numeric(joined['plz']).to_numpy(dtype=float)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000, 10000000])
+    parser.add_argument('--spots', type=int, default=5000)
+    args = parser.parse_args()
+
+    plz_df = gpd.read_file(os.path.join('data', 'external', 'plz_bremen.geojson'))
+    rng = np.random.default_rng(0)
+    spot_lat = rng.uniform(LAT_MIN, LAT_MAX, args.spots).round(6)
+    spot_lng = rng.uniform(LNG_MIN, LNG_MAX, args.spots).round(6)
+
+    for size in args.sizes:
+        spot = rng.integers(0, args.spots, size)
+        pings = pd.DataFrame({'p_lat': spot_lat[spot], 'p_lng': spot_lng[spot]})
+
+        started = time.perf_counter()
+        expected = sjoin_plz(pings, plz_df)
+        sjoin = time.perf_counter() - started
+
+        started = time.perf_counter()
+        lookup = PlzLookup(plz_df)
+        result = lookup.lookup(pings['p_lng'], pings['p_lat'])
+        indexed = time.perf_counter() - started
+
+        np.testing.assert_array_equal(result, expected)
+        print('{:>10} pings {:>6} spots  sjoin {:8.3f}s  lookup {:8.3f}s  speedup {:6.1f}x  (outputs equal)'.format(
+            size, args.spots, sjoin, indexed, sjoin / indexed))
+
+
+if __name__ == '__main__':
+    main()
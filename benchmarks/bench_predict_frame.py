@@ -0,0 +1,72 @@
+"""
+Benchmarks the in-process predictions of Model.predict_*_frame for single trips and micro-batches against a prediction
+through the processed dataset on disk, as "nextbike predict" does it.
+
+Models are trained on synthetic trips in a temporary working directory.
+
+Usage: python -m benchmarks.bench_predict_frame [--batch-sizes 1 10 100] [--repeat 50]
+"""
+import argparse
+import contextlib
+import io as stdio
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_trips
+from nextbike import io
+from nextbike.model.Model import Model
+
+
+def measure(function, repeat):
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - started)
+    return np.percentile(latencies, 50) * 1000, np.percentile(latencies, 99) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--train-trips', type=int, default=50000)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp())
+    for path in ['models', 'data/processed', 'data/predicted']:
+        os.makedirs(path)
+
+    trips = make_trips(args.train_trips)
+    with contextlib.redirect_stdout(stdio.StringIO()):
+        Model().train_duration(trips=trips)
+        Model().train_direction_uni(trips=trips)
+
+    model = Model()
+    for name, frame_method, file_method in [('duration', model.predict_duration_frame, 'predict_duration'),
+                                            ('direction_uni', model.predict_direction_uni_frame,
+                                             'predict_direction_uni')]:
+        for batch_size in args.batch_sizes:
+            batch = trips.head(batch_size)
+            records = batch.assign(start_time=batch['start_time'].astype(str),
+                                   end_time=batch['end_time'].astype(str)).to_dict(orient='records')
+            single = records[0] if batch_size == 1 else records
+            io.save_df(batch, 'batch.csv')
+
+            def through_files():
+                with contextlib.redirect_stdout(stdio.StringIO()):
+                    getattr(Model('batch.csv'), file_method)()
+
+            np.testing.assert_array_equal(frame_method(batch), frame_method(single))
+            results = [('files', measure(through_files, min(args.repeat, 20))),
+                       ('frame', measure(lambda: frame_method(batch), args.repeat)),
+                       ('records', measure(lambda: frame_method(single), args.repeat))]
+            print('{:<14} batch {:>5}  '.format(name, batch_size) + '  '.join(
+                '{} p50 {:7.2f}ms p99 {:7.2f}ms'.format(kind, p50, p99) for kind, (p50, p99) in results))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Measures the memory of cleaned pings, trips and processed trips with default pandas dtypes and with the compact dtypes
+of nextbike.io.SCHEMAS, and checks that the compact dtypes do not change any output.
+
+For every stage, the output computed on compact frames has to equal the output on default frames, both as values and
+as the text written to csv.
+
+Usage: python -m benchmarks.bench_schema [--sizes 1000000 5000000]
+"""
+import argparse
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import make_cleaned_pings, make_trips
+from nextbike import io
+from nextbike.preprocessing.TripFilter import TripFilter
+from nextbike.preprocessing.trips import build_trips
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def assert_equivalent(compact, default):
+    """Asserts that a compact frame holds the values of the default frame and is written to identical csv."""
+    pd.testing.assert_frame_equal(compact.reset_index(drop=True), default.reset_index(drop=True),
+                                  check_dtype=False, check_categorical=False)
+    assert compact.to_csv(index=False) == default.to_csv(index=False)
+
+
+def report(stage, default, compact, seconds_default=None, seconds_compact=None, conversion=None):
+    line = '  {:<16} {:9.1f} MB -> {:7.1f} MB ({:4.1f}x)'.format(
+        stage, io.memory_mb(default), io.memory_mb(compact), io.memory_mb(default) / io.memory_mb(compact))
+    if conversion is not None:
+        line += '   conversion {:7.3f}s'.format(conversion)
+    else:
+        line += '   {:7.3f}s -> {:7.3f}s'.format(seconds_default, seconds_compact)
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000000, 5000000])
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        print('{} pings'.format(size))
+        pings = make_cleaned_pings(size)
+        compact_pings, seconds = timed(io.apply_schema, pings, 'pings')
+        assert_equivalent(compact_pings, pings)
+        report('cleaned pings', pings, compact_pings, conversion=seconds)
+
+        trips, seconds_default = timed(build_trips, pings)
+        compact_trips, seconds_compact = timed(lambda: io.apply_schema(build_trips(compact_pings), 'trips'))
+        assert_equivalent(compact_trips, trips)
+        report('trips', trips, compact_trips, seconds_default, seconds_compact)
+
+        (filtered, _), seconds_default = timed(TripFilter().apply, trips)
+        (compact_filtered, _), seconds_compact = timed(TripFilter().apply, compact_trips)
+        assert_equivalent(compact_filtered, filtered)
+        report('filtered trips', filtered, compact_filtered, seconds_default, seconds_compact)
+
+        processed = make_trips(len(trips))
+        compact_processed, seconds = timed(io.apply_schema, processed, 'trips')
+        assert_equivalent(compact_processed, processed)
+        report('processed trips', processed, compact_processed, conversion=seconds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmarks the latency of the prediction server under concurrent load.
+
+Models are trained on synthetic trips in a temporary working directory, then the server is started in this process and
+each client thread posts batches of trip records over its own keep-alive connection. For comparison, the latency of
+loading the model per request (as every "nextbike predict" does) is measured as well.
+
+Usage: python -m benchmarks.bench_server [--batch-sizes 1 100] [--clients 1 8] [--requests 200]
+"""
+import argparse
+import http.client
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.synthetic import make_trips
+from nextbike import io
+from nextbike.model.Model import Model
+from nextbike.model.ModelServer import ModelServer
+
+
+def percentiles(latencies):
+    return np.percentile(latencies, 50) * 1000, np.percentile(latencies, 99) * 1000
+
+
+def run_client(port, target, body, requests):
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        connection.request('POST', target, body, {'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - started)
+        assert response.status == 200, response.status
+    connection.close()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 10, 100, 1000])
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--requests', type=int, default=100, help='requests per client')
+    parser.add_argument('--train-trips', type=int, default=50000)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp())
+    os.makedirs('data')
+    os.makedirs('models')
+
+    trips = make_trips(args.train_trips)
+    model = Model(None)
+    model.train_duration(trips=trips)
+    model.train_direction_uni(trips=trips)
+
+    server = ModelServer(port=0)
+    port = int(server.address.rsplit(':', 1)[1])
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    frame = trips.head(max(args.batch_sizes))
+    records = frame.assign(start_time=frame['start_time'].astype(str), end_time=frame['end_time'].astype(str))
+
+    for target, name in [('/predict/duration', 'model_duration'), ('/predict/direction/uni', 'model_direction_uni')]:
+        for batch_size in args.batch_sizes:
+            batch = frame.head(batch_size)
+            body = json.dumps(records.head(batch_size).to_dict(orient='records')).encode()
+
+            # load the model per request, like a fresh "nextbike predict"
+            latencies = []
+            for _ in range(min(args.requests, 20)):
+                started = time.perf_counter()
+                io.read_model(name)
+                server.predict(target[len('/predict/'):], batch.copy())
+                latencies.append(time.perf_counter() - started)
+            p50, p99 = percentiles(latencies)
+            print('{:<24} batch {:>5}  load per request            p50 {:8.2f}ms  p99 {:8.2f}ms'.format(
+                target, batch_size, p50, p99))
+
+            for clients in args.clients:
+                with ThreadPoolExecutor(max_workers=clients) as executor:
+                    results = executor.map(run_client, [port] * clients, [target] * clients, [body] * clients,
+                                           [args.requests] * clients)
+                    latencies = [latency for result in results for latency in result]
+                p50, p99 = percentiles(latencies)
+                print('{:<24} batch {:>5}  server, {:>3} clients         p50 {:8.2f}ms  p99 {:8.2f}ms'.format(
+                    target, batch_size, clients, p50, p99))
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Measures the import time of the nextbike entry points with "python -X importtime" and checks that heavy dependencies
+are only loaded by the code paths that need them.
+
+Exits with status 1 if a scenario imports a forbidden module or, with --budget, takes longer than the given number of
+milliseconds, so it can be run as a regression check, e.g. in CI.
+
+Run it from the repository root, the package looks for data/ in the working directory.
+
+Usage: python -m benchmarks.bench_startup [--repeat 5] [--budget 1500]
+"""
+import argparse
+import subprocess
+import sys
+
+# Scenario: (statement run in a fresh interpreter, modules that must not be imported)
+SCENARIOS = {
+    'cli': ('import nextbike.cli', ['geopandas', 'shapely', 'sklearn', 'requests', 'tqdm']),
+    'predict': ('import nextbike.model.Model', ['geopandas', 'shapely', 'sklearn', 'requests', 'tqdm']),
+    'serve': ('import nextbike.model.ModelServer', ['geopandas', 'shapely', 'sklearn', 'requests', 'tqdm']),
+    'transform': ('import nextbike.preprocessing.Preprocessor', ['geopandas', 'shapely', 'sklearn', 'requests', 'tqdm'])
+}
+
+
+def import_times(statement):
+    """Returns the cumulative import time in microseconds of every top-level module imported by statement."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                            stderr=subprocess.PIPE, universal_newlines=True)
+    if result.returncode != 0:
+        raise RuntimeError('{} failed:\n{}'.format(statement, result.stderr[result.stderr.find('Traceback'):]))
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        times[module.strip()] = int(cumulative)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=None, help='maximum import time of a scenario in ms')
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    args = parser.parse_args()
+
+    failed = False
+    for name in args.scenarios:
+        statement, forbidden = SCENARIOS[name]
+        runs = [import_times(statement) for _ in range(args.repeat)]
+        total = min(run[statement.split()[-1]] for run in runs) / 1000
+
+        loaded = sorted(module for module in forbidden if any(module in run for run in runs))
+        slowest = sorted(runs[-1].items(), key=lambda item: -item[1])
+        top = [module for module, _ in slowest if '.' not in module and module != 'nextbike'][:3]
+
+        print('{:<10} {:8.1f}ms  slowest imports: {}'.format(name, total, ', '.join(top)))
+        if loaded:
+            print('{:<10} FAIL imports {}'.format('', ', '.join(loaded)))
+            failed = True
+        if args.budget is not None and total > args.budget:
+            print('{:<10} FAIL exceeds the budget of {:.0f}ms'.format('', args.budget))
+            failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""
+Compares the storage formats of nextbike.io on a processed trips dataset: write time, load time (all columns and a
+projection of the duration model features) and file size.
+
+Usage: python -m benchmarks.bench_storage [--trips 1000000]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.synthetic import make_trips
+from nextbike.io import get_formats, read_frame, with_format, write_frame
+
+
+PROJECTION = ['duration_sec', 'start_plz', 'start_place', 'max_mean_m/s']
+
+
+def timed(function, *args, **kwargs):
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--trips', type=int, default=1000000)
+    args = parser.parse_args()
+
+    trips = make_trips(args.trips)
+
+    with tempfile.TemporaryDirectory() as directory:
+        for storage_format in get_formats():
+            path = with_format(os.path.join(directory, 'trips'), storage_format)
+            _, write = timed(write_frame, trips, path)
+            _, read = timed(read_frame, path, datetime_cols=['start_time', 'end_time'])
+            _, projected = timed(read_frame, path, columns=PROJECTION, datetime_cols=['start_time', 'end_time'])
+
+            print('{:>8}  write {:7.3f}s  read {:7.3f}s  read projected {:7.3f}s  size {:8.1f} MB'.format(
+                storage_format, write, read, projected, os.path.getsize(path) / 2**20))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Measures wall time and peak memory of "nextbike predict all" on a processed dataset loaded at once against the
+streaming mode (--chunksize), with and without worker processes.
+
+Every variant runs as its own process on synthetic processed trips; its peak RSS is taken from its --profile report
+(worker processes are not included). Predictions of trips have to be identical to the ones on the loaded
+dataset; the demand may differ by the rounding of the sums of time buckets with trips in several chunks.
+
+Usage: python -m benchmarks.bench_streaming_predict [--trips 2000000] [--chunksize 200000] [--workers 2]
+"""
+import argparse
+import contextlib
+import filecmp
+import io as stdio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.run import REPOSITORY
+from benchmarks.synthetic import make_trips
+from nextbike import io
+from nextbike.model.Model import Model
+
+
+def predict(args, env):
+    """
+    Runs "nextbike predict all" with the given options and returns its wall time and peak RSS in MB, as recorded by
+    --profile. The peak RSS the operating system reports for a child process would include the one of this process,
+    which it is forked from.
+    """
+    for file in os.listdir(os.path.join('data', 'predicted')):
+        os.remove(os.path.join('data', 'predicted', file))
+    for file in os.listdir(os.path.join('data', 'processed')):
+        if '_demandcube' in file:
+            os.remove(os.path.join('data', 'processed', file))
+
+    started = time.perf_counter()
+    subprocess.run([sys.executable, '-m', 'nextbike.cli', '--profile', 'profile.json', 'predict', 'all'] + args +
+                   ['bench.csv'], env=env, stdout=subprocess.DEVNULL, check=True)
+    seconds = time.perf_counter() - started
+    with open('profile.json') as f:
+        return seconds, json.load(f)['summary']['predict']['peak_rss_mb']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--trips', type=int, default=2000000)
+    parser.add_argument('--chunksize', type=int, default=200000)
+    parser.add_argument('--workers', type=int, default=2)
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix='nextbike-bench-')
+    os.chdir(workdir)
+    try:
+        for path in ['models', 'data/processed', 'data/predicted']:
+            os.makedirs(path)
+        trips = make_trips(args.trips)
+        with contextlib.redirect_stdout(stdio.StringIO()):
+            io.save_df(trips, 'bench.csv')
+            sample = trips.sample(min(len(trips), 50000), random_state=0)
+            for task in ['train_duration', 'train_direction_uni', 'train_direction_main_station']:
+                getattr(Model(), task)(trips=sample)
+            for resolution in ['1H', '6H', '12H', '24H']:
+                Model().train_demand(resolution, trips=sample)
+        del trips
+
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join([REPOSITORY, os.environ.get('PYTHONPATH', '')]))
+        variants = [('loaded at once', []),
+                    ('streaming', ['--chunksize', str(args.chunksize)]),
+                    ('streaming, {} workers'.format(args.workers),
+                     ['--chunksize', str(args.chunksize), '--workers', str(args.workers)])]
+
+        reference = None
+        for name, options in variants:
+            seconds, rss = predict(options, env)
+            print('{} trips  {:<22} {:8.3f}s  peak RSS {:8.1f} MB'.format(args.trips, name, seconds, rss), flush=True)
+
+            if reference is None:
+                reference = tempfile.mkdtemp(dir=workdir)
+                for file in os.listdir(os.path.join('data', 'predicted')):
+                    shutil.copy(os.path.join('data', 'predicted', file), reference)
+                continue
+            for file in os.listdir(reference):
+                expected, actual = os.path.join(reference, file), os.path.join('data', 'predicted', file)
+                if file.startswith('demand'):
+                    pd.testing.assert_frame_equal(pd.read_csv(actual), pd.read_csv(expected),
+                                                  check_exact=False, rtol=1e-9)
+                else:
+                    assert filecmp.cmp(actual, expected, shallow=False), file
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
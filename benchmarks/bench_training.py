@@ -0,0 +1,74 @@
+"""
+Benchmarks the wall time of training the duration and direction forests with 1 to N threads per estimator.
+
+Uses the processed Bremen dataset (data/processed/bremen.*) if it exists in the working directory, otherwise
+synthetic trips. Thread counts above the available CPUs are capped by the parallelism policy, so they are skipped.
+
+Usage: python -m benchmarks.bench_training [--jobs 1 2 4 8] [--synthetic 200000]
+"""
+import argparse
+import contextlib
+import io as stdio
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.synthetic import make_trips
+from nextbike import io
+from nextbike.model import parallel
+from nextbike.model.Model import Model
+
+TASKS = ['train_duration', 'train_direction_uni', 'train_direction_main_station']
+
+
+def load_trips(synthetic):
+    path = io.find_dataset(os.path.join('data', 'processed', 'bremen.csv'))
+    if os.path.isfile(path):
+        print('Training on', path)
+        return io.read_file(path=path, datetime_cols=['start_time', 'end_time'])
+    print('Training on {} synthetic trips'.format(synthetic))
+    return make_trips(synthetic)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--jobs', type=int, nargs='+', default=None)
+    parser.add_argument('--synthetic', type=int, default=200000)
+    args = parser.parse_args()
+
+    cpus = parallel.available_cpus()
+    jobs = args.jobs or sorted({1, 2, 4, 8, cpus})
+    skipped = [j for j in jobs if j > cpus]
+    if skipped:
+        print('Skipping {} threads, only {} CPUs available'.format(', '.join(map(str, skipped)), cpus))
+    jobs = [j for j in jobs if j <= cpus]
+
+    trips = load_trips(args.synthetic)
+
+    # trained models go to a temporary directory instead of models/
+    workdir = tempfile.mkdtemp()
+    os.makedirs(os.path.join(workdir, 'data'))
+    os.makedirs(os.path.join(workdir, 'models'))
+    cwd = os.getcwd()
+    os.chdir(workdir)
+
+    baseline = {}
+    try:
+        for j in jobs:
+            parallel.set_jobs(j)
+            for task in TASKS:
+                started = time.perf_counter()
+                with contextlib.redirect_stdout(stdio.StringIO()):
+                    getattr(Model(), task)(trips=trips)
+                elapsed = time.perf_counter() - started
+                baseline.setdefault(task, elapsed)
+                print('{:<30} {:>3} threads  {:8.2f}s  speedup {:5.2f}x'.format(
+                    task, j, elapsed, baseline[task] / elapsed))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Benchmarks the single-pass TripFilter against the former chain of trip filters of Preprocessor.create_trips.
+
+Synthetic trips are dirtied with trips over 24h, round trips, a day with anomalously many round trips, small groups of
+trips with identical start and end time and missing values, so every rule drops trips. Both outputs are checked for
+equality.
+
+Usage: python -m benchmarks.bench_trip_filter [--sizes 1000000 5000000] [--repeat 3]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import make_trips
+from nextbike.preprocessing.TripFilter import TripFilter
+
+
+def filter_chain(trips, history=None):
+    """The trip filters as they were implemented in Preprocessor._filter_trips."""
+    trips = trips[trips['duration_sec'] < (24*60*60)]
+
+    trips = trips[~((trips['start_lng'] == trips['end_lng']) &
+                    (trips['start_lat'] == trips['end_lat']) &
+                    (trips['start_place'] == 0) & (trips['end_place'] == 0))]
+
+    trips = trips[~((trips['start_lng'] == trips['end_lng']) & (
+        trips['start_lat'] == trips['end_lat']) & (trips['duration_sec'] <= 420))]
+
+    tripsperday = trips[(trips['start_lng'] == trips['end_lng']) & (
+        trips['start_lat'] == trips['end_lat'])].resample('D', on='start_time')['bike'].count()
+    if history is not None:
+        tripsperday = tripsperday.add(history, fill_value=0).asfreq('D', fill_value=0)
+    cutoff = tripsperday.std() * 3
+    tripsmean = tripsperday.median()
+    dropdays = tripsperday[tripsperday > tripsmean +
+                           cutoff].index.strftime('%Y-%m-%d')
+    trips = trips[~((trips['start_time'].dt.strftime('%Y-%m-%d').isin(dropdays)) & (
+        trips['start_lng'] == trips['end_lng']) & (trips['start_lat'] == trips['end_lat']))]
+
+    duplicates = trips.duplicated(
+        subset=['start_time', 'end_time'], keep=False)
+    n_duplicates = trips[duplicates].groupby(['start_time', 'end_time']).agg(
+        {'bike': 'count'}).reset_index().rename({'bike': 'count'}, axis=1)
+    drop_starttimes = n_duplicates[n_duplicates['count']
+                                   < 10]['start_time']
+    trips = trips[~(
+        trips['start_time'].isin(drop_starttimes))]
+
+    trips = trips.fillna(0)
+
+    return trips, tripsperday
+
+
+def make_dirty_trips(n_trips, seed=0):
+    rng = np.random.default_rng(seed)
+    trips = make_trips(n_trips, seed=seed).drop(columns=['temp_2m', 'humidity_2m', 'dew_point_2m'])
+
+    # 1% of the trips last longer than a day
+    long = rng.random(n_trips) < 0.01
+    trips.loc[long, 'duration_sec'] += 24 * 60 * 60
+
+    # 10% round trips, ten times as many on one day
+    day = trips['start_time'].dt.normalize() == trips['start_time'].dt.normalize().iloc[n_trips // 2]
+    round_trip = (rng.random(n_trips) < 0.1) | (day & (rng.random(n_trips) < 0.9))
+    trips.loc[round_trip, 'end_lng'] = trips.loc[round_trip, 'start_lng']
+    trips.loc[round_trip, 'end_lat'] = trips.loc[round_trip, 'start_lat']
+
+    # groups of 2 to 14 trips with identical start and end time
+    sources = rng.choice(n_trips, n_trips // 200, replace=False)
+    copies = sources.repeat(rng.integers(1, 14, len(sources)))
+    duplicates = trips.iloc[copies].assign(bike=rng.integers(20000, 30000, len(copies)))
+    trips = pd.concat([trips, duplicates], ignore_index=True).sort_values('start_time', kind='mergesort')
+
+    # missing values, filled with zeros by both
+    trips.loc[rng.random(len(trips)) < 0.01, 'max_m/s'] = np.nan
+    return trips
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000000, 5000000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        trips = make_dirty_trips(size)
+        history = pd.Series([5, 7], index=pd.DatetimeIndex(['2019-01-01', '2019-01-03']))
+
+        timings = {'chain': [], 'single pass': []}
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            expected, expected_days = filter_chain(trips, history)
+            timings['chain'].append(time.perf_counter() - started)
+
+            tripfilter = TripFilter()
+            started = time.perf_counter()
+            result, days = tripfilter.apply(trips, history)
+            timings['single pass'].append(time.perf_counter() - started)
+
+        pd.testing.assert_frame_equal(result, expected)
+        pd.testing.assert_series_equal(days, expected_days, check_names=False, check_freq=False)
+
+        print('{} trips, {} remaining'.format(len(trips), len(result)))
+        for rule, dropped in tripfilter.dropped.items():
+            print('  {:<20} {:>9} dropped'.format(rule, dropped))
+        for name, seconds in timings.items():
+            print('  {:<12} {:8.3f}s'.format(name, min(seconds)))
+        print('  speedup      {:8.1f}x'.format(min(timings['chain']) / min(timings['single pass'])))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Benchmarks the as-of join of weather onto trips against the former exact merge on the start time floored to 10 minutes.
+
+Weather slots are removed at random to show how many trips each approach retains when observations are missing.
+
+Usage: python -m benchmarks.bench_weather_merge [--sizes 100000 1000000] [--missing 0.01] [--tolerance 30min]
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import make_trips
+from nextbike.preprocessing.trips import attach_weather
+
+
+def floor_merge(trips, weather):
+    """The weather merge as it was implemented in Preprocessor.mergeWeatherTrips."""
+    trips['sTime_floored'] = pd.to_datetime(trips['start_time']).dt.floor('10T')
+    trips['sTime_floored'] = pd.to_datetime(trips['sTime_floored'])
+    data = trips.merge(right=weather, left_on='sTime_floored', right_on='timestamp', how='left')
+    data.drop(columns=['sTime_floored', 'timestamp'], inplace=True)
+    return data.dropna()
+
+
+def asof_join(trips, weather, tolerance):
+    attach_weather(trips, weather, 'start_time', tolerance)
+    attach_weather(trips, weather, 'end_time', tolerance, prefix='end_')
+    return trips.dropna(subset=weather.columns.drop('timestamp'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--missing', type=float, default=0.01, help='share of weather slots removed')
+    parser.add_argument('--tolerance', default='30min')
+    args = parser.parse_args()
+
+    weather = pd.read_csv(os.path.join('data', 'external', 'bremen_weather.gz'), parse_dates=['timestamp'])
+    weather = weather.drop(columns=['mm']).sort_values('timestamp').reset_index(drop=True)
+    rng = np.random.default_rng(0)
+    weather = weather[rng.random(len(weather)) >= args.missing].reset_index(drop=True)
+
+    for size in args.sizes:
+        # Only trip times matter here, the weather columns of the synthetic trips are replaced.
+        trips = make_trips(size)[['bike', 'start_time', 'end_time', 'duration_sec']]
+
+        started = time.perf_counter()
+        merged = floor_merge(trips.copy(), weather)
+        merge = time.perf_counter() - started
+
+        started = time.perf_counter()
+        joined = asof_join(trips.copy(), weather, args.tolerance)
+        asof = time.perf_counter() - started
+
+        print('{:>9} trips  merge {:7.3f}s ({:9.0f} trips/s, {:>9} retained)  '
+              'as-of {:7.3f}s ({:9.0f} trips/s, {:>9} retained, start and end weather)'.format(
+                size, merge, size / merge, len(merged), asof, size / asof, len(joined)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmarks the batched per-zone demand engine (ZoneDemand) against one resampled series and regression per zone.
+
+Synthetic trips are assigned to the given number of zones (as stations). Both approaches have to predict the same
+demand, the engine is timed for training and prediction as a function of the number of zones.
+
+Usage: python -m benchmarks.bench_zone_demand [--zones 10 100 1000] [--trips 500000] [--resolution 1H]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+from sklearn.preprocessing import PolynomialFeatures
+
+from benchmarks.synthetic import make_trips
+from nextbike.model.features import DEMAND_DEGREES, DEMAND_FEATURES
+from nextbike.model.ZoneDemand import ZoneDemand
+
+
+def per_zone(trips, resolution, zones):
+    """One city-wide demand model as in Model.train_demand per zone, on the buckets with trips in the city."""
+    trips = trips.assign(month=trips['start_time'].dt.month, hour=trips['start_time'].dt.hour, number_bookings=1)
+    features = trips.resample(resolution, on='start_time')[DEMAND_FEATURES].mean().dropna()
+    X = PolynomialFeatures(degree=DEMAND_DEGREES[resolution], include_bias=False).fit_transform(features)
+
+    predictions = {}
+    for zone in zones:
+        series = trips[trips['start_place'] == zone].resample(resolution, on='start_time')['number_bookings'].count()
+        y = series.reindex(features.index, fill_value=0)
+        predictions[zone] = LinearRegression().fit(X, y).predict(X)
+    return pd.DataFrame(predictions, index=features.index)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--zones', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--trips', type=int, default=500000)
+    parser.add_argument('--resolution', choices=list(DEMAND_DEGREES), default='1H')
+    parser.add_argument('--loop-max', type=int, default=200, help='largest number of zones run with the loop')
+    args = parser.parse_args()
+
+    trips = make_trips(args.trips)
+    rng = np.random.default_rng(0)
+
+    for zones in args.zones:
+        trips['start_place'] = 4000 + rng.integers(0, zones, len(trips))
+
+        started = time.perf_counter()
+        model = ZoneDemand('station', args.resolution).fit(trips)
+        train = time.perf_counter() - started
+
+        started = time.perf_counter()
+        predicted = model.predict(trips)
+        predict = time.perf_counter() - started
+
+        line = '{:>6} zones  engine train {:7.3f}s  predict {:7.3f}s'.format(zones, train, predict)
+        if zones <= args.loop_max:
+            started = time.perf_counter()
+            expected = per_zone(trips, args.resolution, model.zones)
+            loop = time.perf_counter() - started
+            np.testing.assert_allclose(predicted.to_numpy(), expected.to_numpy(), rtol=1e-6, atol=1e-6)
+            line += '  per-zone loop train+predict {:8.3f}s  speedup {:6.1f}x  (predictions equal)'.format(
+                loop, loop / (train + predict))
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+"""
+Runs every stage of the pipeline on synthetic Nextbike data at several scales and writes the timings as JSON, so
+performance regressions between releases can be found by comparing two result files.
+
+For every scale, synthetic raw pings are written to data/raw/ of a temporary working directory, next to the postcode
+polygons and weather data of this repository. The stages run in the order of "nextbike transform", "nextbike train"
+and "nextbike predict" on that data, each one timed on its own:
+
+    read_raw, clean_dataset, create_trips, prepWeather, mergeWeatherTrips,
+    train_duration, train_direction_uni, train_direction_main_station, train_demand_<resolution>,
+    predict_duration, predict_direction_uni, predict_direction_main_station, predict_demand_<resolution>
+
+Usage:
+    python -m benchmarks.run [--scales 100000 1000000] [--output results.json]
+    python -m benchmarks.run --compare baseline.json results.json [--tolerance 1.2]
+"""
+import argparse
+import contextlib
+import io as stdio
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.synthetic import make_raw_pings
+
+RESOLUTIONS = ['1H', '6H', '12H', '24H']
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def environment():
+    import numpy
+    import pandas
+    import sklearn
+    from nextbike import io
+    from nextbike.model import parallel
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPOSITORY, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, universal_newlines=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': parallel.available_cpus(),
+        'jobs': parallel.get_jobs(),
+        'format': io.get_format(),
+        'numpy': numpy.__version__,
+        'pandas': pandas.__version__,
+        'sklearn': sklearn.__version__
+    }
+
+
+def make_workdir(scale, seed):
+    workdir = tempfile.mkdtemp(prefix='nextbike-bench-')
+    for path in ['data/raw', 'data/processed', 'data/predicted', 'data/external', 'models']:
+        os.makedirs(os.path.join(workdir, path))
+    for name in ['plz_bremen.geojson', 'bremen_weather.gz']:
+        shutil.copy(os.path.join(REPOSITORY, 'data', 'external', name), os.path.join(workdir, 'data', 'external'))
+    make_raw_pings(scale, seed=seed).to_csv(os.path.join(workdir, 'data', 'raw', 'bench.csv'), index=False)
+    return workdir
+
+
+def stages():
+    """
+    Yields (name, function, rows) of every stage. Functions take the state shared between stages, rows returns the
+    number of rows the stage produced and is not timed.
+    """
+    from nextbike import io
+    from nextbike.model.Model import Model
+    from nextbike.preprocessing.Preprocessor import Preprocessor
+
+    def read_raw(state):
+        # the preprocessor loads the raw pings on first use, so they are loaded here to time the read
+        state['preprocessor'] = Preprocessor('bench.csv', refresh=True)
+        state['raw'] = state['preprocessor']._get_raw()
+
+    def clean(state):
+        # cleaning replaces the raw pings of the preprocessor, so every repetition starts from the loaded ones
+        state['preprocessor']._raw = state['raw']
+        state['preprocessor'].clean_dataset()
+
+    def merge(state):
+        preprocessor = state['preprocessor']
+        preprocessor.mergeWeatherTrips(preprocessor._get_trips(), preprocessor._get_weather())
+
+    def processed(step):
+        return lambda state: len(io.read_file(path=io.with_format(os.path.join('data', 'processed', 'bench_' + step)),
+                                                datetime_cols=[]))
+
+    def trips(state):
+        return len(io.read_file(path=io.with_format(os.path.join('data', 'processed', 'bench')), datetime_cols=[]))
+
+    yield 'read_raw', read_raw, lambda state: len(state['raw'])
+    yield 'clean_dataset', clean, processed('cleaned')
+    yield 'create_trips', lambda state: state['preprocessor'].create_trips(), processed('trips')
+    yield 'prepWeather', lambda state: state['preprocessor'].prepWeather(), None
+    yield 'mergeWeatherTrips', merge, trips
+
+    for task in ['train_duration', 'train_direction_uni', 'train_direction_main_station',
+                 'predict_duration', 'predict_direction_uni', 'predict_direction_main_station']:
+        yield task, lambda state, task=task: getattr(Model('bench.csv'), task)(), trips
+    for task in ['train_demand', 'predict_demand']:
+        for resolution in RESOLUTIONS:
+            yield '{}_{}'.format(task, resolution), \
+                lambda state, task=task, resolution=resolution: getattr(Model('bench.csv'), task)(resolution), trips
+
+
+def run_scale(scale, repeat, seed, selected):
+    """Runs all stages at one scale and returns their results."""
+    cwd = os.getcwd()
+    workdir = make_workdir(scale, seed)
+    os.chdir(workdir)
+    results = []
+    try:
+        state = {}
+        for name, function, rows in stages():
+            timings = []
+            # stages build on each other, so every stage runs at least once, also if it is not timed
+            for _ in range(repeat if selected is None or name in selected else 1):
+                started = time.perf_counter()
+                with contextlib.redirect_stdout(stdio.StringIO()):
+                    function(state)
+                timings.append(time.perf_counter() - started)
+            if selected is not None and name not in selected:
+                continue
+            results.append({'stage': name, 'scale': scale, 'seconds': min(timings), 'repeat': repeat,
+                            'rows': rows(state) if rows is not None else None})
+            print('{:>10} pings  {:<32} {:9.3f}s'.format(scale, name, min(timings)), flush=True)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+    return results
+
+
+def compare(baseline, current, tolerance):
+    """Prints the ratio of every stage and scale of current to baseline, returns whether any exceeds tolerance."""
+    before = {(r['stage'], r['scale']): r['seconds'] for r in baseline['results']}
+    regressed = False
+    print('{:<32} {:>10} {:>10} {:>10} {:>7}'.format('stage', 'scale', 'baseline', 'current', 'ratio'))
+    for result in current['results']:
+        key = (result['stage'], result['scale'])
+        if key not in before:
+            continue
+        ratio = result['seconds'] / max(before[key], 1e-9)
+        flag = '  REGRESSION' if ratio > tolerance else ''
+        regressed |= ratio > tolerance
+        print('{:<32} {:>10} {:>9.3f}s {:>9.3f}s {:>6.2f}x{}'.format(key[0], key[1], before[key], result['seconds'],
+                                                                   ratio, flag))
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=int, nargs='+', default=[100000, 1000000],
+                        help='numbers of raw pings')
+    parser.add_argument('--stages', nargs='+', default=None, help='time only these stages, the others just run')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--format', default=None, help='storage format of intermediate and processed datasets')
+    parser.add_argument('--output', default=None, help='JSON file the results are written to')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'), default=None,
+                        help='compare two result files instead of running')
+    parser.add_argument('--tolerance', type=float, default=1.2,
+                        help='ratio to the baseline above which a stage counts as regression')
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+        sys.exit(1 if compare(baseline, current, args.tolerance) else 0)
+
+    from nextbike import io
+    if args.format:
+        io.set_format(args.format)
+
+    report = {'environment': environment(), 'results': []}
+    for scale in args.scales:
+        report['results'] += run_scale(scale, args.repeat, args.seed, args.stages)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+        print('Results written to', args.output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
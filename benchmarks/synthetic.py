@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+
+
+# Bounding box of the city of Bremen, as used by Preprocessor.clean_dataset.
+LAT_MIN, LAT_MAX = 53.011037, 53.228967
+LNG_MIN, LNG_MAX = 8.481593, 8.990582
+
+PLZ = [28195, 28199, 28201, 28203, 28205, 28207, 28209, 28211, 28213, 28215, 28217, 28219, 28237, 28239, 28259,
+       28277, 28279, 28307, 28309, 28325, 28327, 28329, 28355, 28357, 28359]
+
+
+def make_raw_pings(n_rows, n_bikes=None, n_spots=2000, seed=0):
+    """
+    Generates raw Nextbike pings with the columns Preprocessor.clean_dataset expects.
+
+    Bikes park at a limited pool of coordinates in the centre of Bremen, a part of the pings are placed at the
+    23:59/00:00 checkout/checkin times and some are duplicated on [datetime, b_number], like in the real exports.
+    """
+    rng = np.random.default_rng(seed)
+    n_bikes = n_bikes or max(1, n_rows // 250)
+
+    bikes = 20000 + rng.integers(0, n_bikes, n_rows)
+    seconds = rng.integers(0, 365 * 24 * 60 * 60, n_rows)
+    time = pd.Timestamp('2019-01-20') + pd.to_timedelta(seconds, unit='s')
+
+    trip = rng.choice(np.array(['start', 'end', 'first', 'last']), n_rows, p=[0.4, 0.4, 0.1, 0.1])
+    midnight = rng.random(n_rows) < 0.5
+    day = time.floor('D')
+    time = time.where(~((trip == 'first') & midnight), day)
+    time = time.where(~((trip == 'last') & midnight), day + pd.Timedelta(hours=23, minutes=59))
+
+    spot_lat = rng.uniform(53.05, 53.11, n_spots).round(6)
+    spot_lng = rng.uniform(8.75, 8.90, n_spots).round(6)
+    spot_number = np.where(rng.random(n_spots) < 0.3, rng.integers(4000, 4200, n_spots), 0)
+    spot = rng.integers(0, n_spots, n_rows)
+    place = spot_number[spot]
+
+    raw = pd.DataFrame({
+        'datetime': time,
+        'b_number': bikes,
+        'b_bike_type': np.where(bikes % 10 == 0, 150, 71),
+        'p_spot': place != 0,
+        'p_place_type': np.where(place != 0, 0, 12),
+        'trip': trip,
+        'p_uid': place * 1000 + spot,
+        'p_bikes': rng.integers(0, 10, n_rows),
+        'p_name': np.where(place != 0, 'Station ' + pd.Series(place).astype(str), 'BIKE ' + pd.Series(bikes).astype(str)),
+        'p_number': place,
+        'p_bike': place == 0,
+        'p_lat': spot_lat[spot],
+        'p_lng': spot_lng[spot]
+    })
+
+    # Duplicate about one percent of the pings.
+    raw = pd.concat([raw, raw.sample(frac=0.01, random_state=seed)], ignore_index=True)
+    raw.insert(0, 'Unnamed: 0', np.arange(len(raw)))
+    return raw
+
+
+def make_cleaned_pings(n_rows, seed=0, **kwargs):
+    """
+    Generates pings in the format of the cleaned intermediate dataset, i.e. the input of create_trips.
+    """
+    pings = make_raw_pings(n_rows, seed=seed, **kwargs).drop(columns=['Unnamed: 0'])
+    pings = pings[~pings.duplicated(subset=['datetime', 'b_number'], keep='first')]
+    # Derive the postcode from the coordinates, so that pings at the same spot share a PLZ.
+    spot = (pings['p_lat'] * 1e6).astype('int64') + (pings['p_lng'] * 1e6).astype('int64')
+    pings = pings.assign(plz=np.array(PLZ)[spot % len(PLZ)]).sort_values('datetime').reset_index(drop=True)
+    return pings
+
+
+def make_trips(n_trips, seed=0):
+    """
+    Generates trips in the format of the processed dataset, i.e. trips merged with weather data.
+    """
+    rng = np.random.default_rng(seed)
+
+    start_time = pd.Timestamp('2019-01-20') + pd.to_timedelta(rng.integers(0, 365 * 24 * 60 * 60, n_trips), unit='s')
+    start_time = start_time.sort_values()
+    duration = rng.gamma(2.0, 600.0, n_trips).round()
+    end_time = start_time + pd.to_timedelta(duration, unit='s')
+    start_place = np.where(rng.random(n_trips) < 0.3, rng.integers(4000, 4200, n_trips), 0)
+    end_place = np.where(rng.random(n_trips) < 0.3, rng.integers(4000, 4200, n_trips), 0)
+    temp = rng.normal(12, 7, n_trips).round(1)
+
+    return pd.DataFrame({
+        'bike': 20000 + rng.integers(0, max(1, n_trips // 40), n_trips),
+        'identification': rng.integers(0, 5000000, n_trips),
+        'start_time': start_time,
+        'end_time': end_time,
+        'weekend': (start_time.weekday >= 5).astype('int64'),
+        'duration_sec': duration,
+        'start_lng': rng.uniform(8.75, 8.90, n_trips).round(6),
+        'start_lat': rng.uniform(53.05, 53.11, n_trips).round(6),
+        'end_lng': rng.uniform(8.75, 8.90, n_trips).round(6),
+        'end_lat': rng.uniform(53.05, 53.11, n_trips).round(6),
+        'start_place': start_place,
+        'end_place': end_place,
+        'start_plz': np.array(PLZ)[rng.integers(0, len(PLZ), n_trips)],
+        'end_plz': np.array(PLZ)[rng.integers(0, len(PLZ), n_trips)],
+        'temp_2m': temp,
+        'humidity_2m': rng.uniform(40, 100, n_trips).round(1),
+        'dew_point_2m': (temp - rng.uniform(0, 8, n_trips)).round(1),
+        'max_at_2m': (temp + rng.uniform(0, 1, n_trips)).round(1),
+        'mean_speed_h/s': rng.gamma(2.0, 2.0, n_trips).round(1),
+        'direction_degree_x': rng.integers(0, 36, n_trips) * 10.0,
+        'max_m/s': rng.gamma(3.0, 2.0, n_trips).round(1),
+        'min_mean_m/s': rng.gamma(2.0, 1.0, n_trips).round(1),
+        'max_mean_m/s': rng.gamma(2.0, 2.5, n_trips).round(1),
+        'direction_degree_y': rng.integers(0, 36, n_trips) * 10.0,
+        'min': rng.integers(0, 11, n_trips)
+    })
@@ -1,16 +1,55 @@
 import click
-from .model.Model import Model
 import os
-import pathlib
-from .preprocessing.Preprocessor import Preprocessor
 import sys
-from nextbike.io import get_data_path
+from nextbike.io import can_append, get_data_path, get_format, get_formats, set_format, find_dataset
 
 
 @click.group()
-def cli():
+@click.option('-f', '--format', 'storage_format',
+              type=click.Choice(get_formats()),
+              default='csv',
+              show_default=True,
+              help='Storage format of intermediate and processed datasets. Columnar formats (parquet, feather) keep '
+                   'dtypes and load considerably faster.')
+@click.option('-j', '--jobs',
+              metavar='<number of threads>',
+              type=int,
+              envvar='NEXTBIKE_JOBS',
+              default=None,
+              help='Number of threads every model trains and predicts with, -1 for all CPUs. Capped at the available '
+                   'CPUs and divided among worker processes. Defaults to $NEXTBIKE_JOBS or 1.')
+@click.option('--profile',
+              metavar='<path>',
+              type=click.Path(dir_okay=False, writable=True),
+              default=None,
+              help='Write the wall time, memory and rows in and out of every stage of the command to this file.')
+@click.option('--profile-format',
+              type=click.Choice(['json', 'chrome']),
+              default='json',
+              show_default=True,
+              help='Format of the --profile file: a JSON report or a Chrome trace for chrome://tracing or Perfetto.')
+@click.option('--cprofile',
+              metavar='<directory>',
+              type=click.Path(file_okay=False),
+              default=None,
+              help='Profile every top level stage with cProfile and dump the statistics to this directory.')
+@click.pass_context
+def cli(ctx, storage_format, jobs, profile, profile_format, cprofile):
     """This Package exposes a CLI to transform, train on and predict unseeen Nextbike data for various scopes."""
-    pass
+    set_format(storage_format)
+    if profile is not None or cprofile is not None:
+        from . import profiling
+        profiling.enable(cprofile)
+        if profile is not None:
+            # registered first, so the report is written after the span of the command has ended
+            ctx.call_on_close(lambda: profiling.write(profile, profile_format))
+        ctx.with_resource(profiling.span(ctx.invoked_subcommand))
+    if jobs is not None:
+        from .model import parallel
+        try:
+            parallel.set_jobs(jobs)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint='--jobs')
 
 
 @cli.command(short_help='Transforms raw Nextbike format to trips-indexed format.')
@@ -19,41 +58,96 @@ def cli():
               is_flag=True,
               default=False,
               help='If this flag is given, then intermediate datatsets are disregarded.')
-def transform(filename, refresh):
+@click.option('-c', '--chunksize',
+              metavar='<number of rows>',
+              type=click.IntRange(min=1),
+              default=None,
+              help='Clean the raw data in chunks of this many rows, for raw files larger than memory.')
+@click.option('-w', '--workers',
+              metavar='<number of processes>',
+              type=click.IntRange(min=1),
+              default=1,
+              help='Number of worker processes used to build trips, partitioned by bike.')
+@click.option('-a', '--append-to',
+              metavar='<processed filename>',
+              default=None,
+              help='Incrementally transform only new pings of FILENAME and append them to an already transformed '
+                   'dataset, e.g. a daily delivery to bremen.csv.')
+@click.option('-t', '--weather-tolerance',
+              metavar='<time span>',
+              default='30min',
+              show_default=True,
+              help='Maximum age of the weather observation attached to the start and end of a trip, e.g. 10min or 1H.')
+@click.option('--checkpoints/--no-checkpoints',
+              default=True,
+              show_default=True,
+              help='Save the cleaned pings and trips as intermediate datasets. Stages hand their output to the next '
+                   'one in memory either way; without checkpoints, a later run cannot skip stages or append.')
+def transform(filename, refresh, chunksize, workers, append_to, weather_tolerance, checkpoints):
     """
     This command allows for transforming raw Nextbike data to a more human and machine-learning friendly format indexed by trips.
 
     Input             -> Output\n
     data/raw/FILENAME -> data/preprocessed/FILENAME
     """
-    p = Preprocessor(filename=filename, refresh=refresh)
-    p.run()
+    if append_to is not None and chunksize is not None:
+        click.echo('The options --append-to and --chunksize cannot be combined.', err=True)
+        sys.exit(0)
+    if chunksize is not None and not can_append():
+        streamable = ', '.join(name for name in get_formats() if can_append(name))
+        raise click.BadParameter('Streaming requires a storage format that can be written in chunks ({}), not {}.'
+                                 .format(streamable, get_format()), param_hint='--chunksize')
+
+    # The commands import their dependencies on use, so each command only loads what it needs.
+    from .preprocessing.Preprocessor import Preprocessor
+
+    p = Preprocessor(filename=filename, refresh=refresh, chunksize=chunksize, workers=workers,
+                     weather_tolerance=weather_tolerance, checkpoints=checkpoints)
+    if append_to is not None:
+        p.append_to(append_to)
+    else:
+        p.run()
 
 
 @cli.command(short_help='Train duration, direction or demand models.')
 @click.argument('whatmodel', metavar='<model>',
                 nargs=1,
-                type=click.Choice(['duration', 'direction', 'demand']),
+                type=click.Choice(['duration', 'direction', 'demand', 'all']),
                 required=True)
 @click.option('-t', '--resolution',
               metavar='<temporal resolution>',
               type=click.Choice(['1', '6', '12', '24']),
               default=None,
-              help='The temporal resolution used for resampling the data in combination with demand prediction.')
-def train(whatmodel, resolution):
+              help='The temporal resolution used for resampling the data in combination with demand prediction. '
+                   'Defaults to all resolutions in combination with "all".')
+@click.option('-w', '--workers',
+              metavar='<number of processes>',
+              type=click.IntRange(min=1),
+              default=1,
+              help='Number of worker processes used in combination with "all".')
+@click.option('-z', '--zone',
+              type=click.Choice(['city', 'plz', 'station']),
+              default='city',
+              show_default=True,
+              help='Spatial resolution of the demand: the whole city, per postcode or per station.')
+def train(whatmodel, resolution, workers, zone):
     """
     This command allows for training several machine-learning models for different scopes on preprocessed Nextbike data.
     A trips-indexed Nextbike file for the city of Bremen must exist in data/processed/.
 
-    Duration, direction and demand models are available.
-    Models are saved after training as pre-trained models in pickle format under /models/.
+    Duration, direction and demand models are available. Demand is modelled for the whole city or, with --zone, for
+    every postcode or station at once.
+    "all" trains every model on a single load of the dataset, optionally in parallel worker processes.
+    Models are saved after training as pre-trained models under /models/, each with a header recording its features,
+    training data hash, sklearn version and training time.
     """
 
-    if not os.path.isfile(os.path.join(get_data_path(), 'processed/bremen.csv')):
+    if not os.path.isfile(find_dataset(os.path.join(get_data_path(), 'processed/bremen.csv'))):
         click.echo(
             'Could not find /data/processed/bremen.csv - please run preprocessing first using " nextbike transform".', err=True)
         sys.exit(0)
 
+    from .model.Model import Model
     m = Model('bremen.csv')
     if whatmodel == 'duration':
         m.train_duration()
@@ -65,14 +159,18 @@ def train(whatmodel, resolution):
             click.echo(
                 'No temporal resolution defined, please specify using the -t/--resolution parameter.')
             sys.exit(0)
+        elif zone != 'city':
+            m.train_zone_demand(zone, resolution + 'H')
         else:
             m.train_demand(resolution +'H')
+    elif whatmodel == 'all':
+        m.train_all(_resolutions(resolution), workers)
 
 
 @cli.command(short_help='Predict trip duration, direction or bike demand.')
 @click.argument('whatmodel', metavar='<model>',
                 nargs=1,
-                type=click.Choice(['duration', 'direction', 'demand']),
+                type=click.Choice(['duration', 'direction', 'demand', 'all']),
                 required=True)
 @click.option('--uni', 'direction', flag_value='uni', help='Specifies direction towards Bremen university, when predicting direction.')
 @click.option('--mainstation', 'direction', flag_value='hbf', help='Specifies direction towards Bremen main station, when predicting direction.')
@@ -80,21 +178,41 @@ def train(whatmodel, resolution):
               metavar='<temporal resolution>',
               type=click.Choice(['1', '6', '12', '24']),
               default=None,
-              help='The temporal resolution used for resampling the data in combination with demand prediction.')
+              help='The temporal resolution used for resampling the data in combination with demand prediction. '
+                   'Defaults to all resolutions in combination with "all".')
+@click.option('-c', '--chunksize',
+              metavar='<number of rows>',
+              type=click.IntRange(min=1),
+              default=None,
+              help='Predict the processed data in chunks of this many rows, for processed files larger than memory.')
+@click.option('-w', '--workers',
+              metavar='<number of processes>',
+              type=click.IntRange(min=1),
+              default=1,
+              help='Number of worker processes used in combination with "all" or to predict chunks concurrently with '
+                   '--chunksize.')
+@click.option('-z', '--zone',
+              type=click.Choice(['city', 'plz', 'station']),
+              default='city',
+              show_default=True,
+              help='Spatial resolution of the demand: the whole city, per postcode or per station.')
 @click.argument('filename', type=click.Path(), required=True)
-def predict(whatmodel, direction, resolution, filename):
+def predict(whatmodel, direction, resolution, chunksize, workers, zone, filename):
     """
     Predict several aspects (duration, direction and demand) of unseen Nextbike Data.
     Requires the respective trained model.
     Data has to be in trips-indexed format (use the transform command) in /data/processed/.
 
     When predicting the direction of trips, please specify a direction using the "--uni" or "--mainstation" flag.
-    When predicting the demand of bikes, please specify a temporal resolution (1, 6, 12, 24).
+    When predicting the demand of bikes, please specify a temporal resolution (1, 6, 12, 24) and optionally a --zone.
+    "all" predicts with every model (both directions) on a single load of the dataset.
+    With --chunksize, the dataset is streamed in chunks and the predictions are appended chunk by chunk.
 
     Predictions are saved under /data/predicted/
     """
 
-    m = Model(filename)
+    from .model.Model import Model
+    m = Model(filename, chunksize=chunksize, workers=workers)
     if whatmodel == 'duration':
         m.predict_duration()
     elif whatmodel == 'direction':
@@ -110,8 +228,48 @@ def predict(whatmodel, direction, resolution, filename):
             click.echo(
                 'No temporal resolution defined, please specify using the -t/--resolution parameter.')
             sys.exit(0)
+        elif zone != 'city':
+            m.predict_zone_demand(zone, resolution + 'H')
         else:
             m.predict_demand(resolution + 'H')
+    elif whatmodel == 'all':
+        m.predict_all(_resolutions(resolution), workers)
+
+
+@cli.command(short_help='Serve predictions of all trained models over HTTP.')
+@click.option('-h', '--host',
+              metavar='<address>',
+              default='127.0.0.1',
+              show_default=True,
+              help='Address the server listens on.')
+@click.option('-p', '--port',
+              metavar='<port>',
+              type=click.IntRange(min=0, max=65535),
+              default=8000,
+              show_default=True,
+              help='Port the server listens on.')
+@click.option('-s', '--socket',
+              metavar='<path>',
+              type=click.Path(),
+              default=None,
+              help='Listen on a Unix socket at this path instead of host and port.')
+def serve(host, port, socket):
+    """
+    Starts a local prediction service that keeps all models of /models/ in memory and reloads them when their files
+    change.
+
+    Trip records in the trips-indexed format are posted as JSON list to /predict/duration, /predict/direction/uni,
+    /predict/direction/main_station, /predict/demand/<1H|6H|12H|24H>, /predict/demand/<plz|station>/<1H|6H|12H|24H> or
+    /predict (all models) and the predictions are returned as JSON.
+    """
+    from .model.ModelServer import ModelServer
+    ModelServer(host=host, port=port, socket=socket).serve_forever()
+
+
+def _resolutions(resolution):
+    if resolution is None:
+        return ['1H', '6H', '12H', '24H']
+    return [resolution + 'H']
 
 
 if __name__ == '__main__':
@@ -1,3 +1,5 @@
 from .input import *
 from .output import *
 from .utils import *
+from .formats import *
+from .schema import *
@@ -0,0 +1,194 @@
+import os
+import pandas as pd
+
+
+def _write_csv(df, path):
+    df.to_csv(path, index=False)
+
+
+def _read_csv(path, columns, datetime_cols):
+    return pd.read_csv(path, usecols=columns, parse_dates=datetime_cols,
+                       infer_datetime_format=True, cache_dates=True)
+
+
+class _CsvAppender:
+
+    def __init__(self, path):
+        self._path = path
+        self._header = True
+
+    def write(self, df):
+        df.to_csv(self._path, mode='w' if self._header else 'a', header=self._header, index=False)
+        self._header = False
+
+    def close(self):
+        pass
+
+
+def _write_parquet(df, path):
+    df.to_parquet(path, index=False)
+
+
+def _read_parquet(path, columns, datetime_cols):
+    return pd.read_parquet(path, columns=columns)
+
+
+class _ParquetAppender:
+
+    def __init__(self, path):
+        self._path = path
+        self._writer = None
+
+    def write(self, df):
+        import pyarrow
+        import pyarrow.parquet
+        table = pyarrow.Table.from_pandas(df, preserve_index=False)
+        # Categoricals of different chunks have their own categories, so their codes are stored in one integer type
+        # for all chunks, and the other columns take the types of the first chunk.
+        table = table.cast(pyarrow.schema([
+            field.with_type(pyarrow.dictionary(pyarrow.int32(), field.type.value_type, field.type.ordered))
+            if pyarrow.types.is_dictionary(field.type) else field for field in table.schema
+        ], metadata=table.schema.metadata))
+        if self._writer is None:
+            self._writer = pyarrow.parquet.ParquetWriter(self._path, table.schema)
+        else:
+            table = table.cast(self._writer.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def _write_feather(df, path):
+    df.reset_index(drop=True).to_feather(path)
+
+
+def _read_feather(path, columns, datetime_cols):
+    return pd.read_feather(path, columns=columns)
+
+
+# Storage backends by name: (file extension, writer, reader, appender). Formats without appender cannot be written
+# chunk by chunk.
+_formats = {
+    'csv': ('.csv', _write_csv, _read_csv, _CsvAppender),
+    'parquet': ('.parquet', _write_parquet, _read_parquet, _ParquetAppender),
+    'feather': ('.feather', _write_feather, _read_feather, None)
+}
+
+_format = 'csv'
+
+
+def register_format(name, extension, writer, reader, appender=None):
+    """
+    Registers a storage backend. writer(df, path) persists a DataFrame, reader(path, columns, datetime_cols) loads it,
+    optionally restricted to a list of columns. appender(path) optionally returns an object with write(df) and close()
+    methods to write a DataFrame in chunks.
+    """
+    _formats[name] = (extension, writer, reader, appender)
+
+
+def get_formats():
+    return list(_formats)
+
+
+def set_format(name):
+    """Sets the storage format used for intermediate and processed datasets."""
+    global _format
+    if name not in _formats:
+        raise ValueError('Unknown storage format {} - use one of {}.'.format(name, ', '.join(_formats)))
+    _format = name
+
+
+def get_format():
+    return _format
+
+
+def strip_extension(name):
+    """Returns the name of a dataset without the extension of any known storage format."""
+    for extension, _, _, _ in _formats.values():
+        if name.endswith(extension):
+            return name[:-len(extension)]
+    return name
+
+
+def get_format_of(path):
+    """Returns the storage format of a file by its extension. Unknown extensions are read as csv."""
+    for name, (extension, _, _, _) in _formats.items():
+        if path.endswith(extension):
+            return name
+    return 'csv'
+
+
+def with_format(path, name=None):
+    """Returns path with the extension of the given (or currently set) storage format."""
+    return strip_extension(path) + _formats[name or _format][0]
+
+
+def find_dataset(path):
+    """
+    Returns path in the currently set storage format if it exists, otherwise the first existing file of the same
+    dataset in another format. If no such file exists, path in the current format is returned.
+    """
+    candidates = [with_format(path)] + [with_format(path, name) for name in _formats if name != _format]
+    for candidate in candidates:
+        if os.path.isfile(candidate):
+            return candidate
+    return candidates[0]
+
+
+def write_frame(df, path):
+    _formats[get_format_of(path)][1](df, path)
+
+
+def read_frame(path, columns=None, datetime_cols=None):
+    datetime_cols = [col for col in (datetime_cols or []) if columns is None or col in columns]
+    df = _formats[get_format_of(path)][2](path, columns, datetime_cols)
+
+    # Columnar formats keep their dtypes, only datasets written before in text form need parsing.
+    for col in datetime_cols:
+        if not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = pd.to_datetime(df[col])
+    return df
+
+
+def open_appender(path):
+    """
+    Returns a writer that appends DataFrames chunk by chunk to path. The caller has to close it after the last chunk.
+    """
+    name = get_format_of(path)
+    appender = _formats[name][3]
+    if appender is None:
+        raise ValueError('The storage format {} does not support writing in chunks.'.format(name))
+    return appender(path)
+
+
+def can_append(name=None):
+    """Returns whether the given (or currently set) storage format can be written in chunks."""
+    return _formats[name or _format][3] is not None
+
+
+def read_frame_chunks(path, chunksize, columns=None, datetime_cols=None):
+    """
+    Yields a dataset in DataFrames of at most chunksize rows. Only csv and parquet files are read in bounded memory,
+    files of other formats are loaded at once and split afterwards.
+    """
+    datetime_cols = [col for col in (datetime_cols or []) if columns is None or col in columns]
+    name = get_format_of(path)
+
+    if name == 'csv':
+        chunks = pd.read_csv(path, usecols=columns, parse_dates=datetime_cols,
+                             infer_datetime_format=True, cache_dates=True, chunksize=chunksize)
+    elif name == 'parquet':
+        import pyarrow.parquet
+        batches = pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns)
+        chunks = (batch.to_pandas() for batch in batches)
+    else:
+        df = read_frame(path, columns=columns, datetime_cols=datetime_cols)
+        chunks = (df.iloc[start:start + chunksize] for start in range(0, len(df), chunksize))
+
+    for chunk in chunks:
+        for col in datetime_cols:
+            if not pd.api.types.is_datetime64_any_dtype(chunk[col]):
+                chunk[col] = pd.to_datetime(chunk[col])
+        yield chunk
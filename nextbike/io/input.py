@@ -1,17 +1,51 @@
+from .. import profiling
 from .utils import *
-import pandas as pd
+from .formats import read_frame
+from .schema import apply_schema
+import json
 import os
 import pickle
 
 
-def read_file(path=os.path.join(get_data_path(), "input/<My_data>.csv"), datetime_cols=['datetime']):
-    df = pd.read_csv(path, parse_dates=datetime_cols,
-                     infer_datetime_format=True, cache_dates=True)
+def read_file(path=os.path.join(get_data_path(), "input/<My_data>.csv"), datetime_cols=['datetime'], columns=None,
+              schema=None):
+    """Reads a dataset, optionally with the compact dtypes of a schema ('pings' or 'trips', see io.SCHEMAS)."""
+    with profiling.span('read') as span:
+        df = read_frame(path, columns=columns, datetime_cols=datetime_cols)
+        if schema is not None:
+            df = apply_schema(df, schema)
+        span.rows_out = len(df)
     return df
 
 
+def get_model_file(name):
+    """
+    Returns the file of a model: the artifact <name>.model or, for models saved by former versions, the plain pickle
+    <name>.pkl. Raises FileNotFoundError if neither exists.
+    """
+    for extension in ['.model', '.pkl']:
+        path = os.path.join(get_model_path(), name + extension)
+        if os.path.isfile(path):
+            return path
+    raise FileNotFoundError(2, 'No such model', os.path.join(get_model_path(), name + '.model'))
+
+
 def read_model(name):
-    path = os.path.join(get_model_path(), "" + name + ".pkl")
+    path = get_model_file(name)
+    with open(path, "rb") as f:
+        if path.endswith('.model'):
+            # skip the header
+            f.readline()
+        return pickle.load(f)
+
+
+def read_model_header(name):
+    """
+    Returns the metadata header of a model without loading the model itself, an empty dict for models saved by former
+    versions.
+    """
+    path = get_model_file(name)
+    if not path.endswith('.model'):
+        return {}
     with open(path, "rb") as f:
-        model = pickle.load(f)
-    return model
+        return json.loads(f.readline())
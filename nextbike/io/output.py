@@ -1,22 +1,79 @@
+from .. import profiling
 from .utils import *
+from .formats import get_format_of, open_appender, read_frame, with_format, write_frame
+from datetime import datetime
+import hashlib
+import json
 import os
+import pandas as pd
 import pickle
 
 
-def save_model(model, modelName):
-    with open(os.path.join(get_model_path(), '' + modelName + '.pkl'), 'wb') as pickle_file:
-        pickle.dump(model, pickle_file)
+def save_model(model, modelName, features=None, target=None, **metadata):
+    """
+    Saves a model as artifact models/<name>.model: a header of one line of JSON, followed by the pickled estimator.
+    The header records the feature columns, the row count and a SHA-256 hash of the training data (features and
+    target), the sklearn version, the training time and any further metadata given as keyword arguments.
+    """
+    import sklearn
+
+    header = dict(metadata, name=modelName, estimator=type(model).__name__, sklearn_version=sklearn.__version__,
+                  trained_at=datetime.now().isoformat(timespec='seconds'))
+    if features is not None:
+        digest = hashlib.sha256(pd.util.hash_pandas_object(features, index=False).values.tobytes())
+        if target is not None:
+            digest.update(pd.util.hash_pandas_object(target, index=False).values.tobytes())
+        header.update(features=list(features.columns), training_rows=len(features),
+                      training_data_sha256=digest.hexdigest())
+
+    path = os.path.join(get_model_path(), modelName + '.model')
+    # Write to a temporary file first, so a running prediction server never loads a partially written model.
+    with profiling.span('save_model'), open(path + '.tmp', 'wb') as f:
+        f.write(json.dumps(header).encode() + b'\n')
+        pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + '.tmp', path)
 
 
 def save_df(df, name):
-    path = os.path.join(get_data_path(), 'processed/' +
-                        name.replace('.csv', '') + '.csv')
-    df.to_csv(path, index=False)
+    path = with_format(os.path.join(get_data_path(), 'processed/' + name))
+    with profiling.span('save', rows_in=len(df)):
+        write_frame(df, path)
     print('Dataframe saved to', path)
 
 
-def save_prediction(df, name):
-    path = os.path.join(get_data_path(), 'predicted/' +
+def append_df(df, name):
+    path = with_format(os.path.join(get_data_path(), 'processed/' + name))
+    with profiling.span('append', rows_in=len(df)):
+        _append_frame(df, path)
+    print('Dataframe appended to', path)
+
+
+def _append_frame(df, path):
+    if not os.path.isfile(path):
+        write_frame(df, path)
+    elif get_format_of(path) == 'csv':
+        # keep the column order of the existing file
+        columns = pd.read_csv(path, nrows=0).columns
+        df[columns].to_csv(path, mode='a', header=False, index=False)
+    else:
+        write_frame(pd.concat([read_frame(path), df], ignore_index=True), path)
+
+
+def _prediction_path(name):
+    return os.path.join(get_data_path(), 'predicted/' +
                         name.replace('.csv', '') + '.csv')
-    df.to_csv(path, index=False)
+
+
+def save_prediction(df, name):
+    path = _prediction_path(name)
+    with profiling.span('save', rows_in=len(df)):
+        df.to_csv(path, index=False)
     print('Prediction saved to', path)
+
+
+def open_prediction(name):
+    """
+    Returns a writer that appends a prediction chunk by chunk to the file save_prediction writes. The caller has to
+    close it after the last chunk.
+    """
+    return open_appender(_prediction_path(name))
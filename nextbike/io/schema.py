@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+# Compact dtypes of the columns of cleaned pings and of trips. Enumerations are categoricals, integers are stored in
+# the smallest type that holds every Nextbike value and postcodes as nullable integers. Coordinates and weather values
+# stay float64: they are given with 6 and 1 decimals, which float32 does not represent exactly.
+SCHEMAS = {
+    'pings': {
+        'b_number': 'int32',
+        'b_bike_type': 'category',
+        'p_place_type': 'int8',
+        'trip': 'category',
+        'p_uid': 'int32',
+        'p_bikes': 'int16',
+        'p_name': 'category',
+        'p_number': 'int32',
+        'plz': 'Int32'
+    },
+    'trips': {
+        'bike': 'int32',
+        'bike_type': 'category',
+        'identification': 'int32',
+        'weekend': 'int8',
+        'start_place': 'int32',
+        'end_place': 'int32',
+        'start_plz': 'Int32',
+        'end_plz': 'Int32'
+    }
+}
+
+
+def apply_schema(df, name):
+    """
+    Returns df with the compact dtypes of the schema name ('pings' or 'trips') for all columns it has. Integer columns
+    are only narrowed if all values fit, so unexpected values keep their dtype instead of overflowing.
+    """
+    dtypes = {}
+    for col, dtype in SCHEMAS[name].items():
+        if col not in df or df[col].dtype == dtype:
+            continue
+        values = df[col]
+        if dtype == 'category':
+            dtypes[col] = dtype
+        elif pd.api.types.is_integer_dtype(values) or pd.api.types.is_float_dtype(values):
+            # Nullable integers hold missing values, the others only whole numbers.
+            if (dtype[0] != 'I' and values.hasnans) or not _fits(values, dtype):
+                continue
+            dtypes[col] = dtype
+    return df.astype(dtypes) if dtypes else df
+
+
+def _fits(values, dtype):
+    """Returns whether all values of a numeric column are whole numbers within the range of the integer dtype."""
+    info = np.iinfo(dtype.lower())
+    values = values.dropna()
+    if values.empty:
+        return True
+    if pd.api.types.is_float_dtype(values) and not (values % 1 == 0).all():
+        return False
+    return info.min <= values.min() and values.max() <= info.max
+
+
+def memory_mb(df):
+    """Returns the memory held by a DataFrame in MB, including the strings of object columns."""
+    return df.memory_usage(deep=True).sum() / 2 ** 20
@@ -0,0 +1,149 @@
+from . import parallel
+import numpy as np
+import pandas as pd
+
+
+class CompiledForest:
+    """
+    Random forest of sklearn (RandomForestRegressor or RandomForestClassifier) converted to contiguous node arrays, so
+    all of its trees are evaluated together instead of by one sklearn call per tree.
+
+    The nodes of all trees are stored in one set of arrays: the feature and threshold of every split, both children and
+    the value, which is the leaf prediction of a regressor and the normalized class probabilities of a classifier.
+    Leaves point to themselves, so rows that reach a leaf early stay there until the deepest tree is traversed.
+
+    Small batches are traversed by NumPy operations per tree level, which saves the overhead of the forest per tree and
+    call. Batches of at least compiled_rows rows are traversed by a loop compiled with numba, divided among n_jobs
+    threads, if numba is installed (extra "compiled"), and are predicted by the forest itself otherwise. Predictions
+    are identical either way: features are compared in float32 like sklearn does, and the predictions of the trees are
+    added in the order of the forest before they are averaged.
+    """
+
+    # Batches from which numba is loaded to traverse the trees. Below, NumPy is faster than the forest and loading
+    # numba does not pay off.
+    compiled_rows = 2000
+
+    # Number of tree nodes (trees x rows) NumPy traverses at once, which bounds the memory of a block.
+    block_nodes = 2 ** 18
+
+    def __init__(self, forest, n_jobs=1):
+        trees = [estimator.tree_ for estimator in forest.estimators_]
+        self.estimator = forest
+        self.n_jobs = n_jobs
+        self.n_features_in_ = forest.n_features_in_
+        self.classes_ = getattr(forest, 'classes_', None)
+        self._n_trees = len(trees)
+        self._depth = max(tree.max_depth for tree in trees)
+
+        offsets = np.cumsum([0] + [tree.node_count for tree in trees])
+        self._roots = offsets[:-1].astype(np.intp)
+
+        features, thresholds, children, values = [], [], [], []
+        for offset, tree in zip(offsets, trees):
+            nodes = np.arange(tree.node_count)
+            leaf = tree.children_left < 0
+            features.append(np.where(leaf, 0, tree.feature))
+            thresholds.append(np.where(leaf, 0, tree.threshold))
+            children.append(np.stack([np.where(leaf, nodes, tree.children_left),
+                                      np.where(leaf, nodes, tree.children_right)], axis=1) + offset)
+            values.append(self._leaf_values(tree.value[:, 0, :]))
+
+        self._feature = np.concatenate(features).astype(np.intp)
+        self._threshold = np.concatenate(thresholds)
+        # children of node i at 2 * i (left) and 2 * i + 1 (right)
+        self._children = np.concatenate(children).astype(np.intp).ravel()
+        # one column per class, a single one for a regressor
+        self._value = np.ascontiguousarray(np.concatenate(values))
+
+    @staticmethod
+    def supports(model):
+        """Returns whether model is a fitted random forest of sklearn with a single output, which can be compiled."""
+        try:
+            from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+        except ImportError:
+            return False
+        return type(model) in (RandomForestClassifier, RandomForestRegressor) and \
+            hasattr(model, 'estimators_') and model.n_outputs_ == 1
+
+    def _leaf_values(self, value):
+        if self.classes_ is None:
+            return value[:, :1]
+        # like DecisionTreeClassifier.predict_proba
+        normalizer = value.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        return value / normalizer
+
+    def predict(self, X):
+        """Returns the prediction of the forest for every row of X, like the predict method of the forest."""
+        if self.classes_ is None:
+            return self._predict(X)[:, 0]
+        return self.classes_.take(np.argmax(self._predict(X), axis=1), axis=0)
+
+    def predict_proba(self, X):
+        """Returns the class probabilities of every row of X, like the predict_proba method of the classifier."""
+        if self.classes_ is None:
+            raise AttributeError('A regression forest does not predict probabilities.')
+        return self._predict(X)
+
+    def _predict(self, X):
+        values = self._as_array(X)
+        out = np.zeros((len(values), self._value.shape[1]))
+
+        if len(values) < self.compiled_rows:
+            block = max(1, self.block_nodes // self._n_trees)
+            for start in range(0, len(values), block):
+                self._traverse_block(values[start:start + block], out[start:start + block])
+        else:
+            jobs = parallel.available_cpus() if self.n_jobs == -1 else max(1, self.n_jobs or 1)
+            traverse = _compiled_traverse()
+            if traverse is None:
+                self.estimator.n_jobs = jobs
+                if self.classes_ is None:
+                    return self.estimator.predict(X)[:, np.newaxis]
+                return self.estimator.predict_proba(X)
+            traverse(values, self._roots, self._feature, self._threshold, self._children, self._value, self._depth,
+                     out, jobs)
+
+        out /= self._n_trees
+        return out
+
+    def _traverse_block(self, X, out):
+        n_rows, n_features = X.shape
+        # offset of the row of every (tree, row) pair in the flattened X
+        rows = np.arange(n_rows, dtype=np.intp) * n_features
+        nodes = np.repeat(self._roots[:, np.newaxis], n_rows, axis=1)
+
+        for _ in range(self._depth):
+            right = X.take(rows + self._feature[nodes]) > self._threshold[nodes]
+            nodes = self._children.take(2 * nodes + right)
+
+        # trees are added in the order of the forest, like sklearn does
+        for tree_values in self._value[nodes]:
+            out += tree_values
+
+    def _as_array(self, X):
+        # sklearn predicts on float32 features
+        if isinstance(X, pd.DataFrame):
+            X = X.to_numpy(dtype=np.float32, na_value=np.nan)
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError('X has shape {}, but the forest is fitted on {} features.'.format(
+                X.shape, self.n_features_in_))
+        if not np.isfinite(X).all():
+            raise ValueError('Input contains NaN, infinity or a value too large for dtype(\'float32\').')
+        return X
+
+
+_traverse = None
+
+
+def _compiled_traverse():
+    """Returns forest_kernel.traverse, None if numba is not installed."""
+    global _traverse
+    if _traverse is None:
+        try:
+            from .forest_kernel import traverse
+        except ImportError:
+            traverse = False
+        _traverse = traverse
+    return _traverse or None
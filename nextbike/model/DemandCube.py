@@ -0,0 +1,96 @@
+from .. import io
+from .features import demand_values, DEMAND_FEATURES
+import numpy as np
+import os
+import pandas as pd
+
+
+class DemandCube:
+    """
+    Aggregate of the trips of a dataset per hour, from which the demand at every coarser resolution is rolled up.
+
+    Every hour holds the number of trips and the sums of the demand features (month, hour, temperature and rain
+    duration) over its trips. Sums are additive, so the demand per 6, 12 or 24 hours is the sum of its hours, and the
+    cube of a new batch of trips can be added to the cube of the former trips. The mean features per time bucket are
+    only computed for a view.
+
+    The cube of a processed dataset is persisted next to it as <dataset>_demandcube.
+    """
+
+    granularity = '1H'
+
+    def __init__(self, cube=None):
+        if cube is None:
+            cube = self._aggregate(pd.DataFrame({'start_time': pd.to_datetime([]), 'temp_2m': [], 'min': []}))
+        self.cube = cube
+
+    @classmethod
+    def from_trips(cls, trips):
+        """Returns the cube of trips with the attributes start_time, temp_2m and min."""
+        return cls(cls._aggregate(trips))
+
+    @classmethod
+    def _aggregate(cls, trips):
+        codes, hours = pd.factorize(trips['start_time'].dt.floor(cls.granularity), sort=True)
+        values = demand_values(trips)
+
+        cube = {'number_bookings': np.bincount(codes, minlength=len(hours))}
+        for name in DEMAND_FEATURES:
+            cube[name + '_sum'] = np.bincount(codes, weights=values[name], minlength=len(hours))
+        return pd.DataFrame(cube, index=pd.DatetimeIndex(hours, name='start_time'))
+
+    def update(self, trips):
+        """Adds a batch of new trips to the cube."""
+        cube = self.cube.add(self._aggregate(trips), fill_value=0)
+        self.cube = cube.astype({'number_bookings': 'int64'})
+        return self
+
+    def view(self, resolution):
+        """
+        Returns the number of trips and the mean demand features per time bucket of the given resolution, for all
+        buckets with trips.
+        """
+        cube = self.cube[self.cube['number_bookings'] > 0]
+        if resolution != self.granularity:
+            cube = cube.groupby(cube.index.floor(resolution)).sum()
+            cube.index.name = 'start_time'
+
+        view = pd.DataFrame({'number_bookings': cube['number_bookings']})
+        for name in DEMAND_FEATURES:
+            view[name] = cube[name + '_sum'] / cube['number_bookings']
+        return view
+
+    @staticmethod
+    def get_path(dataset):
+        """Returns the path of the cube of a processed dataset, without extension."""
+        return io.strip_extension(dataset) + '_demandcube'
+
+    @classmethod
+    def load(cls, path):
+        return cls(io.read_frame(path, datetime_cols=['start_time']).set_index('start_time'))
+
+    def save(self, path):
+        io.write_frame(self.cube.reset_index(), path)
+
+    @classmethod
+    def for_dataset(cls, dataset, chunksize=None):
+        """
+        Returns the cube of a processed dataset. The persisted cube is used if it is at least as recent as the
+        dataset, otherwise the cube is built from the dataset and persisted, with chunksize by reading the dataset in
+        chunks of this many rows. Raises FileNotFoundError if the dataset does not exist.
+        """
+        path = io.find_dataset(cls.get_path(dataset))
+        if os.path.isfile(path) and os.path.getmtime(path) >= os.path.getmtime(dataset):
+            return cls.load(path)
+
+        print('Building the demand cube of {}...'.format(dataset))
+        columns = ['start_time', 'temp_2m', 'min']
+        if chunksize is None:
+            cube = cls.from_trips(io.read_file(path=dataset, datetime_cols=['start_time'], columns=columns))
+        else:
+            # hours with trips in several chunks are summed over them
+            cube = cls()
+            for chunk in io.read_frame_chunks(dataset, chunksize, columns=columns, datetime_cols=['start_time']):
+                cube.update(chunk)
+        cube.save(io.with_format(cls.get_path(dataset)))
+        return cube
@@ -1,13 +1,16 @@
-from .. import io
-from sklearn.ensemble import RandomForestRegressor, RandomForestClassifier
-from sklearn.linear_model import LinearRegression
-from sklearn.preprocessing import PolynomialFeatures
+from .. import io, profiling
+from .features import distance_towards, DEMAND_DEGREES, DEMAND_FEATURES, UNIVERSITY, MAIN_STATION
+from .DemandCube import DemandCube
+from .ModelCache import ModelCache
+from .ZoneDemand import ZoneDemand
+from . import parallel
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import os
 import pandas as pd
-import geopandas as gpd
 from math import sin, cos, sqrt, atan2, radians
 from nextbike.io import get_data_path
-from tqdm import tqdm
 
 
 class Model:
@@ -29,18 +32,46 @@ class Model:
         'end_plz'
     ]
 
-    def __init__(self, filename):
-        self._datapath = get_data_path()
+    # Predictions that stream the processed dataset in chunks: the method predicting one chunk of trips and the name
+    # of the prediction its results are appended to. The demand per zone is counted per chunk instead and predicted
+    # once all chunks are counted.
+    _chunk_predictions = {
+        'predict_duration': ('_duration_prediction', 'duration_prediction'),
+        'predict_direction_uni': ('_direction_uni_prediction', 'direction_prediction_uni'),
+        'predict_direction_main_station': ('_direction_main_station_prediction', 'direction_prediction_main_station')
+    }
+
+    # Without filename, only the in-process predictions on given trips (predict_*_frame) are available. With
+    # chunksize, predictions stream the processed dataset in chunks of this many rows, predicted by the given number
+    # of worker processes.
+    def __init__(self, filename=None, chunksize=None, workers=1):
+        self._datapath = get_data_path() if filename is not None else None
         self._filename = filename
-
-    def train_duration(self):
-
+        self._chunksize = chunksize
+        self._workers = workers
+        self._cube = None
+
+    def _get_dataset_path(self):
+        return io.find_dataset(os.path.join(self._datapath, 'processed', self._filename))
+
+    # Returns the given trips or loads them from the processed dataset. Given trips are shallow copied, so features
+    # added by one model do not leak into the frame shared with the others.
+    def _load_trips(self, trips=None, columns=None):
+        if trips is not None:
+            return trips.copy(deep=False)
         try:
-            trips_duration = io.read_file(path=os.path.join(
-                self._datapath, 'processed', self._filename), datetime_cols=['start_time', 'end_time'])
+            return io.read_file(path=self._get_dataset_path(), datetime_cols=['start_time', 'end_time'],
+                                columns=columns, schema='trips')
         except FileNotFoundError:
             print(
                 'The dataset data/processed/{} does not exist - please run preprocessing first.'.format(self._filename))
+            return None
+
+    @profiling.profiled
+    def train_duration(self, trips=None):
+
+        trips_duration = self._load_trips(trips, columns=['duration_sec', 'start_plz', 'start_place', 'max_mean_m/s'])
+        if trips_duration is None:
             return
 
         print('Generating features...')
@@ -50,24 +81,25 @@ class Model:
         X = trips_duration[['start_plz', 'start_place', 'max_mean_m/s']]
         y = trips_duration['duration_min']
 
+        # sklearn is imported on use, predictions load the estimators with the pickled models
+        from sklearn.ensemble import RandomForestRegressor
         rf = RandomForestRegressor(
-            criterion='mse', n_estimators=512, max_depth=2)
+            criterion='mse', n_estimators=512, max_depth=2, n_jobs=parallel.get_jobs())
 
         print('Training model...')
-        rf.fit(X, y)
+        with profiling.span('fit', rows_in=len(X)):
+            rf.fit(X, y)
 
-        io.save_model(rf, "model_duration")
+        io.save_model(rf, "model_duration", features=X, target=y)
 
         print('Model saved.')
 
-    def train_direction_uni(self):
+    @profiling.profiled
+    def train_direction_uni(self, trips=None):
 
-        try:
-            trips_direction = io.read_file(path=os.path.join(
-                self._datapath, 'processed', self._filename), datetime_cols=['start_time', 'end_time'])
-        except FileNotFoundError:
-            print(
-                'The dataset data/processed/{} does not exist - please run preprocessing first.'.format(self._filename))
+        trips_direction = self._load_trips(trips, columns=['start_time', 'start_lng', 'start_lat', 'end_lng', 'end_lat',
+                                                           'humidity_2m', 'dew_point_2m', 'max_mean_m/s'])
+        if trips_direction is None:
             return
 
         print('Working on Direction -> University...')
@@ -75,34 +107,7 @@ class Model:
         trips_direction["start_time"] = pd.to_datetime(
             trips_direction["start_time"])
 
-        # Lists of target variables
-        to_uni = []
-        to_uni_bool = []
-
-        # Lists of features
-        hour = []
-
-        # Iterrate through df and add features to feature lists
-        for index, row in tqdm(trips_direction.iterrows(), total=len(trips_direction), desc='Calculating distances:'):
-
-            dist_to_uni = self.distanceToUni(
-                row['start_lng'], row['start_lat'], row['end_lng'], row['end_lat'])
-
-            # Save datetime information
-            hour.append(row['start_time'].hour)
-
-            # Save distances to corresponding list
-            to_uni.append(dist_to_uni)
-
-            if dist_to_uni < 0:
-                to_uni_bool.append(0)
-            else:
-                to_uni_bool.append(1)
-
-        # Add columns to df
-        trips_direction['to_uni'] = to_uni
-        trips_direction['to_uni_bool'] = to_uni_bool
-        trips_direction['hour'] = hour
+        self._add_direction_features(trips_direction, 'to_uni', UNIVERSITY)
 
         # Initialize independent and target variables
         X_uni = trips_direction[['start_lng', 'start_lat',
@@ -112,22 +117,23 @@ class Model:
         print('Training model...')
 
         # Train RandomForestClassifier with optimzed hyperparameters through grid search (see notebook #8)
+        from sklearn.ensemble import RandomForestClassifier
         rf_uni = RandomForestClassifier(
-            criterion='entropy', class_weight='balanced_subsample', n_estimators=256, max_depth=7)
-        rf_uni.fit(X_uni, y_uni)
+            criterion='entropy', class_weight='balanced_subsample', n_estimators=256, max_depth=7,
+            n_jobs=parallel.get_jobs())
+        with profiling.span('fit', rows_in=len(X_uni)):
+            rf_uni.fit(X_uni, y_uni)
 
         # Save model
-        io.save_model(rf_uni, "model_direction_uni")
+        io.save_model(rf_uni, "model_direction_uni", features=X_uni, target=y_uni)
         print('Model saved.')
 
-    def train_direction_main_station(self):
+    @profiling.profiled
+    def train_direction_main_station(self, trips=None):
 
-        try:
-            trips_direction = io.read_file(path=os.path.join(
-                self._datapath, 'processed', self._filename), datetime_cols=['start_time', 'end_time'])
-        except FileNotFoundError:
-            print(
-                'The dataset data/processed/{} does not exist - please run preprocessing first.'.format(self._filename))
+        trips_direction = self._load_trips(trips, columns=['start_time', 'start_lng', 'start_lat', 'end_lng', 'end_lat',
+                                                           'start_plz', 'humidity_2m', 'dew_point_2m', 'max_m/s'])
+        if trips_direction is None:
             return
 
         print('Working on Direction -> Main Station...')
@@ -135,34 +141,7 @@ class Model:
         trips_direction["start_time"] = pd.to_datetime(
             trips_direction["start_time"])
 
-        # Lists of target variables
-        to_main_station = []
-        to_main_station_bool = []
-
-        # Lists of features
-        hour = []
-
-        # Iterrate through df and add features to feature lists
-        for index, row in tqdm(trips_direction.iterrows(), total=len(trips_direction), desc='Calculating distances:'):
-
-            dist_to_main_station = self.distanceToMainStation(
-                row['start_lng'], row['start_lat'], row['end_lng'], row['end_lat'])
-
-            # Save datetime information
-            hour.append(row['start_time'].hour)
-
-            # Save distances to corresponding list
-            to_main_station.append(dist_to_main_station)
-
-            if dist_to_main_station < 0:
-                to_main_station_bool.append(0)
-            else:
-                to_main_station_bool.append(1)
-
-        # Add columns to df
-        trips_direction['to_main_station'] = to_main_station
-        trips_direction['to_main_station_bool'] = to_main_station_bool
-        trips_direction['hour'] = hour
+        self._add_direction_features(trips_direction, 'to_main_station', MAIN_STATION)
 
         # Initialize independent and target variables
         X_main_station = trips_direction[[
@@ -172,268 +151,486 @@ class Model:
         print('Training model...')
 
         # Train RandomForestClassifier with optimzed hyperparameters through grid search (see notebook #8)
+        from sklearn.ensemble import RandomForestClassifier
         rf_main_station = RandomForestClassifier(
-            criterion='entropy', class_weight='balanced_subsample', n_estimators=256, max_depth=7)
-        rf_main_station.fit(X_main_station, y_main_station)
+            criterion='entropy', class_weight='balanced_subsample', n_estimators=256, max_depth=7,
+            n_jobs=parallel.get_jobs())
+        with profiling.span('fit', rows_in=len(X_main_station)):
+            rf_main_station.fit(X_main_station, y_main_station)
 
         # Save model
-        io.save_model(rf_main_station, 'model_direction_main_station')
+        io.save_model(rf_main_station, 'model_direction_main_station', features=X_main_station,
+                      target=y_main_station)
         print('Model saved.')
 
-    # data by timespan 24H, 1H, 4H, 12H
-    def _setDataset(self, dataset, temp_resol, columnnamegroupby, functions_dic):
-        return dataset.resample(
-            temp_resol, on=columnnamegroupby).agg(functions_dic)
-
-    def train_demand(self, resolution):
-
-        try:
-            trips_demand = io.read_file(path=os.path.join(
-                self._datapath, 'processed', self._filename), datetime_cols=['start_time', 'end_time'])
-        except FileNotFoundError:
-            print(
-                'The dataset data/processed/{} does not exist - please run preprocessing first.'.format(self._filename))
+    # Adds month, booking date, weekday and hour of the start time as features, unless they already exist.
+    def _add_time_features(self, trips):
+        if 'month' not in trips:
+            trips['month'] = trips['start_time'].dt.month
+        if 'booking_date' not in trips:
+            trips['booking_date'] = trips['start_time'].dt.date
+        if 'weekdays' not in trips:
+            trips['weekdays'] = trips['start_time'].dt.weekday
+        if 'hour' not in trips:
+            trips['hour'] = trips['start_time'].dt.hour
+
+    # Adds the distance delta towards the given point of interest, whether the trip moved towards it and the hour of
+    # the start time as features, unless they already exist.
+    def _add_direction_features(self, trips, target, poi):
+        if target not in trips:
+            trips[target] = distance_towards(trips, [poi])[:, 0]
+            trips[target + '_bool'] = np.where(trips[target] < 0, 0, 1)
+        if 'hour' not in trips:
+            trips['hour'] = trips['start_time'].dt.hour
+
+    # Adds the features shared by several models in one pass, so they are only computed once for all of them.
+    def _add_shared_features(self, trips):
+        self._add_time_features(trips)
+        distances = distance_towards(trips, [UNIVERSITY, MAIN_STATION])
+        trips['to_uni'] = distances[:, 0]
+        trips['to_uni_bool'] = np.where(trips['to_uni'] < 0, 0, 1)
+        trips['to_main_station'] = distances[:, 1]
+        trips['to_main_station_bool'] = np.where(trips['to_main_station'] < 0, 0, 1)
+
+    @profiling.profiled
+    def train_demand(self, resolution, trips=None):
+
+        cube = self._get_demand_cube(trips)
+        if cube is None:
             return
 
         print('Generating features...')
 
-        for col in ['start_time']:
-            trips_demand['month'] = pd.DatetimeIndex(
-                trips_demand['start_time']).month
-            trips_demand['booking_date'] = trips_demand.start_time.dt.date
-            trips_demand['weekdays'] = pd.DatetimeIndex(
-                trips_demand['start_time']).weekday
-            trips_demand['hour'] = trips_demand['start_time'].dt.hour
+        trips_demand, X_poly = self._demand_features(cube, resolution)
+        y = trips_demand['number_bookings']
 
-        features = ['month', "hour", 'temp_2m', "min"]
+        from sklearn.linear_model import LinearRegression
+        poly_reg = LinearRegression()
 
-        trips_demand['number_bookings'] = 1
+        print('Training model...')
+        with profiling.span('fit', rows_in=len(X_poly)):
+            poly_reg.fit(X_poly, y)
 
-        trips_demand = self._setDataset(trips_demand, resolution, "start_time", {
-                                        "number_bookings": "count", "month": "mean",  "hour": "mean", "temp_2m": "mean", "min": "mean"})
-        trips_demand.dropna(axis=0, inplace=True)
+        io.save_model(poly_reg, "model_demand_" + resolution,
+                      features=trips_demand[DEMAND_FEATURES], target=y, resolution=resolution)
 
-        X = trips_demand[features]
-        y = trips_demand['number_bookings']
+        print('Model saved.')
 
-        switch = {
-            '1H': 5,
-            '6H': 3,
-            '12H': 2,
-            '24H': 1
-        }
+    @profiling.profiled
+    def train_zone_demand(self, zone, resolution, trips=None):
 
-        poly_features = PolynomialFeatures(
-            degree=switch.get(resolution), include_bias=False)
-        X_poly = poly_features.fit_transform(X)
+        trips_demand = self._load_trips(trips, columns=['start_time', 'start_plz', 'start_place', 'temp_2m', 'min'])
+        if trips_demand is None:
+            return
 
-        poly_reg = LinearRegression()
+        print('Counting trips per {} and time bucket...'.format(zone))
+        demand = ZoneDemand(zone, resolution)
 
         print('Training model...')
-        poly_reg.fit(X_poly, y)
-
-        io.save_model(poly_reg, "model_demand_" + resolution)
+        with profiling.span('fit', rows_in=len(trips_demand)):
+            demand.fit(trips_demand)
 
+        io.save_model(demand, "model_demand_{}_{}".format(zone, resolution), zone=zone, resolution=resolution,
+                      zones=len(demand.zones))
         print('Model saved.')
 
-    def predict_duration(self):
+    @profiling.profiled
+    def predict_duration(self, trips=None):
+        if trips is None and self._chunksize is not None:
+            return self._predict_chunked([('predict_duration', ())], self._workers)
 
-        try:
-            trips_duration = io.read_file(path=os.path.join(
-                self._datapath, 'processed', self._filename), datetime_cols=['start_time', 'end_time'])
-        except FileNotFoundError:
-            print(
-                'The dataset data/processed/{} does not exist - please run preprocessing first.'.format(self._filename))
+        trips_duration = self._load_trips(trips)
+        if trips_duration is None:
             return
 
         print('Generating features...')
 
+        io.save_prediction(
+            self._duration_prediction(trips_duration), 'duration_prediction')
+        print('Saved prediction for further evaluation.')
+
+    # Returns the trips with their predicted duration and the attributes exported with it.
+    def _duration_prediction(self, trips_duration):
         trips_duration['duration_min'] = trips_duration['duration_sec']/60
 
-        X = trips_duration[['start_plz', 'start_place', 'max_mean_m/s']]
+        X = self._duration_features(trips_duration)
 
-        model = io.read_model("model_duration")
-        trips_duration['prediction'] = model.predict(X)
+        model = self._get_model("model_duration")
+        with profiling.span('predict', rows_in=len(X)):
+            trips_duration['prediction'] = model.predict(X)
 
         # extend the usual export with additional features used in this prediction
         export_attributes = self._export_attributes + \
             ['duration_min','max_mean_m/s', 'prediction']
 
-        io.save_prediction(
-            trips_duration[export_attributes], 'duration_prediction')
-        print('Saved prediction for further evaluation.')
+        return trips_duration[export_attributes]
 
     # This function predicts for each trip in the data set new_data.csv if its direction is toward the university of Bremen.
-    def predict_direction_uni(self):
+    @profiling.profiled
+    def predict_direction_uni(self, trips=None):
+        if trips is None and self._chunksize is not None:
+            return self._predict_chunked([('predict_direction_uni', ())], self._workers)
 
-        try:
-            trips_direction = io.read_file(path=os.path.join(
-                self._datapath, 'processed', self._filename), datetime_cols=['start_time', 'end_time'])
-        except FileNotFoundError:
-            print(
-                'The dataset data/processed/{} does not exist - please run preprocessing first.'.format(self._filename))
+        trips_direction = self._load_trips(trips)
+        if trips_direction is None:
             return
 
-        trips_direction["start_time"] = pd.to_datetime(
-            trips_direction["start_time"])
-
-        print('Generating features...')
-
-        # Lists of target variables
-        to_uni = []
-        to_uni_bool = []
-
-        # Lists of features
-        hour = []
-
-        # Iterrate through df and add features to feature lists
-        for index, row in tqdm(trips_direction.iterrows(), total=len(trips_direction), desc='Calculating distances:'):
-
-            dist_to_uni = self.distanceToUni(
-                row['start_lng'], row['start_lat'], row['end_lng'], row['end_lat'])
-
-            # Save datetime information
-            hour.append(row['start_time'].hour)
+        print('Predicting if trips are in direction to uni.')
 
-            # Save distances to corresponding list
-            to_uni.append(dist_to_uni)
+        io.save_prediction(
+            self._direction_uni_prediction(trips_direction), 'direction_prediction_uni')
+        print('Saved prediction for further evaluation.')
 
-            if dist_to_uni < 0:
-                to_uni_bool.append(0)
-            else:
-                to_uni_bool.append(1)
+    # Returns the trips with the prediction whether they head towards the university and the attributes exported with
+    # it.
+    def _direction_uni_prediction(self, trips_direction):
+        trips_direction["start_time"] = pd.to_datetime(
+            trips_direction["start_time"])
 
-        # Add columns to df
-        trips_direction['to_uni'] = to_uni
-        trips_direction['to_uni_bool'] = to_uni_bool
-        trips_direction['hour'] = hour
+        self._add_direction_features(trips_direction, 'to_uni', UNIVERSITY)
 
-        print('Predicting if trips are in direction to uni.')
         # Initialize independent and target variables
-        X = trips_direction[['start_lng', 'start_lat',
-                             'humidity_2m', 'dew_point_2m', 'max_mean_m/s', 'hour']]
+        X = self._direction_uni_features(trips_direction)
 
         # Load prediction model
-        model = io.read_model("model_direction_uni")
-        trips_direction['prediction_to_uni'] = model.predict(X)
+        model = self._get_model("model_direction_uni")
+        with profiling.span('predict', rows_in=len(X)):
+            trips_direction['prediction_to_uni'] = model.predict(X)
 
         # extend the usual export with additional features used in this prediction
         export_attributes = self._export_attributes + \
             ['to_uni_bool','humidity_2m', 'dew_point_2m', 'max_mean_m/s',
                 'hour', 'prediction_to_uni']
 
-        io.save_prediction(
-            trips_direction[export_attributes], 'direction_prediction_uni')
-        print('Saved prediction for further evaluation.')
+        return trips_direction[export_attributes]
 
     # This function predicts for each trip in the data set new_data.csv if its direction is toward the main station of Bremen.
-    def predict_direction_main_station(self):
+    @profiling.profiled
+    def predict_direction_main_station(self, trips=None):
+        if trips is None and self._chunksize is not None:
+            return self._predict_chunked([('predict_direction_main_station', ())], self._workers)
 
-        try:
-            trips_direction = io.read_file(path=os.path.join(
-                self._datapath, 'processed', self._filename), datetime_cols=['start_time', 'end_time'])
-        except FileNotFoundError:
-            print(
-                'The dataset data/processed/{} does not exist - please run preprocessing first.'.format(self._filename))
+        trips_direction = self._load_trips(trips)
+        if trips_direction is None:
             return
 
-        trips_direction["start_time"] = pd.to_datetime(
-            trips_direction["start_time"])
-
-        # Lists of target variables
-        to_main_station = []
-        to_main_station_bool = []
-
-        # Lists of features
-        hour = []
-
-        # Iterrate through df and add features to feature lists
-        for index, row in tqdm(trips_direction.iterrows(), total=len(trips_direction), desc='Calculating distances:'):
-
-            dist_to_main_station = self.distanceToMainStation(
-                row['start_lng'], row['start_lat'], row['end_lng'], row['end_lat'])
-
-            # Save datetime information
-            hour.append(row['start_time'].hour)
+        print('Predicting if trips are in direction to main station.')
 
-            # Save distances to corresponding list
-            to_main_station.append(dist_to_main_station)
+        io.save_prediction(
+            self._direction_main_station_prediction(trips_direction), 'direction_prediction_main_station')
+        print('Saved prediction for further evaluation.')
 
-            if dist_to_main_station < 0:
-                to_main_station_bool.append(0)
-            else:
-                to_main_station_bool.append(1)
+    # Returns the trips with the prediction whether they head towards the main station and the attributes exported
+    # with it.
+    def _direction_main_station_prediction(self, trips_direction):
+        trips_direction["start_time"] = pd.to_datetime(
+            trips_direction["start_time"])
 
-        # Add columns to df
-        trips_direction['to_main_station'] = to_main_station
-        trips_direction['to_main_station_bool'] = to_main_station_bool
-        trips_direction['hour'] = hour
+        self._add_direction_features(trips_direction, 'to_main_station', MAIN_STATION)
 
-        print('Predicting if trips are in direction to main station.')
         # Initialize independent and target variables
-        X = trips_direction[['start_lng', 'start_plz',
-                             'humidity_2m', 'dew_point_2m', 'max_m/s', 'hour']]
+        X = self._direction_main_station_features(trips_direction)
 
         # Load prediction model
-        model = io.read_model("model_direction_main_station")
-        trips_direction['prediction_to_main_station'] = model.predict(X)
+        model = self._get_model("model_direction_main_station")
+        with profiling.span('predict', rows_in=len(X)):
+            trips_direction['prediction_to_main_station'] = model.predict(X)
 
         # extend the usual export with additional features used in this prediction
         export_attributes = self._export_attributes + \
             ['to_main_station_bool','humidity_2m', 'dew_point_2m', 'max_m/s',
                 'hour', 'prediction_to_main_station']
 
+        return trips_direction[export_attributes]
+
+    @profiling.profiled
+    def predict_demand(self, resolution, trips=None):
+
+        cube = self._get_demand_cube(trips)
+        if cube is None:
+            return
+
+        trips_demand, X_poly = self._demand_features(cube, resolution)
+
+        model = self._get_model("model_demand_" + resolution)
+
+        with profiling.span('predict', rows_in=len(X_poly)):
+            trips_demand['prediction_' + resolution] = model.predict(X_poly)
+
         io.save_prediction(
-            trips_direction[export_attributes], 'direction_prediction_main_station')
-        print('Saved prediction for further evaluation.')
+            trips_demand, 'demand_prediction_' + resolution)
 
-    def predict_demand(self, resolution):
+        print('Saved prediction for further evaluation.')
 
+    # Returns a trained model. Models are kept in memory by a cache shared within the process, so they are only
+    # loaded again when their file changes. Estimators predict with the number of threads currently set.
+    def _get_model(self, name):
+        with profiling.span('load_model'):
+            model = ModelCache.default().get(name)
+        if hasattr(model, 'n_jobs'):
+            model.n_jobs = parallel.get_jobs()
+        return model
+
+    # Returns trips given as DataFrame, list of records or single record as DataFrame with parsed timestamps.
+    def _as_frame(self, trips):
+        if isinstance(trips, pd.DataFrame):
+            trips = trips.copy(deep=False)
+        else:
+            trips = pd.DataFrame.from_records([trips] if isinstance(trips, dict) else trips)
+        for col in ['start_time', 'end_time']:
+            if col in trips and not pd.api.types.is_datetime64_any_dtype(trips[col]):
+                trips[col] = pd.to_datetime(trips[col])
+        return trips
+
+    def predict_duration_frame(self, trips):
+        """
+        Returns the predicted duration in minutes of each trip. Trips are given as DataFrame, list of records or a single
+        record (dict) and need the attributes start_plz, start_place and max_mean_m/s.
+        """
+        trips = self._as_frame(trips)
+        return self._get_model("model_duration").predict(self._duration_features(trips))
+
+    def predict_direction_uni_frame(self, trips):
+        """
+        Returns for each trip whether it heads towards the University of Bremen (1) or not (0). Trips need the
+        attributes start_time, start_lng, start_lat, humidity_2m, dew_point_2m and max_mean_m/s.
+        """
+        trips = self._as_frame(trips)
+        return self._get_model("model_direction_uni").predict(self._direction_uni_features(trips))
+
+    def predict_direction_main_station_frame(self, trips):
+        """
+        Returns for each trip whether it heads towards the main station of Bremen (1) or not (0). Trips need the
+        attributes start_time, start_lng, start_plz, humidity_2m, dew_point_2m and max_m/s.
+        """
+        trips = self._as_frame(trips)
+        return self._get_model("model_direction_main_station").predict(self._direction_main_station_features(trips))
+
+    def predict_demand_frame(self, trips, resolution):
+        """
+        Returns the demand of the trips resampled to the given resolution (1H, 6H, 12H or 24H), indexed by the start of
+        each time bucket, with the predicted demand in the column prediction_<resolution>. Trips need the attributes
+        start_time, temp_2m and min.
+        """
+        demand, X_poly = self._demand_features(DemandCube.from_trips(self._as_frame(trips)), resolution)
+        demand['prediction_' + resolution] = self._get_model("model_demand_" + resolution).predict(X_poly)
+        return demand
+
+    # Feature matrices of the prediction models. They only need the columns the models use, so they are shared by
+    # the file based predictions and the prediction server.
+    def _duration_features(self, trips):
+        return trips[['start_plz', 'start_place', 'max_mean_m/s']]
+
+    def _direction_uni_features(self, trips):
+        if 'hour' not in trips:
+            trips['hour'] = trips['start_time'].dt.hour
+        return trips[['start_lng', 'start_lat', 'humidity_2m', 'dew_point_2m', 'max_mean_m/s', 'hour']]
+
+    def _direction_main_station_features(self, trips):
+        if 'hour' not in trips:
+            trips['hour'] = trips['start_time'].dt.hour
+        return trips[['start_lng', 'start_plz', 'humidity_2m', 'dew_point_2m', 'max_m/s', 'hour']]
+
+    # Returns the demand cube of the given trips, of the trips shared by train_all/predict_all or of the processed
+    # dataset, which is persisted and only rebuilt if the dataset changed (in chunks, if streaming).
+    def _get_demand_cube(self, trips=None):
+        if self._cube is not None:
+            return self._cube
+        if trips is not None:
+            return DemandCube.from_trips(trips)
         try:
-            trips_demand = io.read_file(path=os.path.join(
-                self._datapath, 'processed', self._filename), datetime_cols=['start_time', 'end_time'])
+            with profiling.span('demand_cube'):
+                return DemandCube.for_dataset(self._get_dataset_path(), chunksize=self._chunksize)
         except FileNotFoundError:
             print(
                 'The dataset data/processed/{} does not exist - please run preprocessing first.'.format(self._filename))
+            return None
+
+    # Returns the demand per time bucket of the given resolution, rolled up from the demand cube, and its polynomial
+    # features.
+    def _demand_features(self, cube, resolution):
+        from sklearn.preprocessing import PolynomialFeatures
+
+        demand = cube.view(resolution)
+        X = demand[DEMAND_FEATURES]
+
+        poly_features = PolynomialFeatures(
+            degree=DEMAND_DEGREES.get(resolution), include_bias=False)
+        return demand, poly_features.fit_transform(X)
+
+    @profiling.profiled
+    def predict_zone_demand(self, zone, resolution, trips=None):
+        if trips is None and self._chunksize is not None:
+            return self._predict_chunked([('predict_zone_demand', (zone, resolution))], self._workers)
+
+        trips_demand = self._load_trips(trips)
+        if trips_demand is None:
             return
 
-        for col in ['start_time']:
-            trips_demand['month'] = pd.DatetimeIndex(
-                trips_demand['start_time']).month
-            trips_demand['booking_date'] = trips_demand.start_time.dt.date
-            trips_demand['weekdays'] = pd.DatetimeIndex(
-                trips_demand['start_time']).weekday
-            trips_demand['hour'] = trips_demand['start_time'].dt.hour
+        demand = self._get_model("model_demand_{}_{}".format(zone, resolution))
+        with profiling.span('predict', rows_in=len(trips_demand)):
+            prediction = demand.predict(trips_demand)
+        counts, _ = demand.tensor(trips_demand, zones=demand.zones)
 
-        features = ['month', "hour", 'temp_2m', "min"]
+        self._save_zone_demand(counts, prediction, zone, resolution)
 
-        trips_demand['number_bookings'] = 1
+    def _save_zone_demand(self, counts, prediction, zone, resolution):
+        # one row per time bucket and zone
+        prediction = pd.DataFrame({
+            'number_bookings': counts.stack(),
+            'prediction_' + resolution: prediction.stack()
+        }).reset_index()
 
-        trips_demand = self._setDataset(trips_demand, resolution, "start_time", {
-                                        "number_bookings": "count", "month": "mean",  "hour": "mean", "temp_2m": "mean", "min": "mean"})
-        trips_demand.dropna(axis=0, inplace=True)
+        io.save_prediction(prediction, 'demand_prediction_{}_{}'.format(zone, resolution))
+        print('Saved prediction for further evaluation.')
 
-        X = trips_demand[features]
+    def predict_zone_demand_frame(self, trips, zone, resolution):
+        """
+        Returns the predicted demand per time bucket of the given resolution (rows) and zone (columns), for zone 'plz'
+        or 'station'. Trips need the attributes start_time, temp_2m and min.
+        """
+        return self._get_model("model_demand_{}_{}".format(zone, resolution)).predict(self._as_frame(trips))
+
+    @profiling.profiled
+    def train_all(self, resolutions=('1H', '6H', '12H', '24H'), workers=1):
+        """
+        Trains the duration, both direction and the demand models for the given resolutions on a single load of the
+        processed dataset. Features shared by the models are computed once. With workers > 1 the models are trained
+        in parallel worker processes.
+        """
+        tasks = [('train_duration', ()), ('train_direction_uni', ()), ('train_direction_main_station', ())] + \
+                [('train_demand', (resolution,)) for resolution in resolutions]
+        self._run_all(tasks, workers)
+
+    @profiling.profiled
+    def predict_all(self, resolutions=('1H', '6H', '12H', '24H'), workers=1):
+        """
+        Predicts duration, both directions and the demand for the given resolutions on a single load of the processed
+        dataset. Features shared by the models are computed once. With workers > 1 the predictions run in parallel
+        worker processes. If the model streams the dataset in chunks, all models predict each chunk in one pass and
+        the workers predict chunks concurrently.
+        """
+        tasks = [('predict_duration', ()), ('predict_direction_uni', ()), ('predict_direction_main_station', ())] + \
+                [('predict_demand', (resolution,)) for resolution in resolutions]
+        if self._chunksize is not None:
+            self._predict_chunked(tasks, workers)
+        else:
+            self._run_all(tasks, workers)
+
+    def _predict_chunked(self, tasks, workers):
+        """
+        Streaming variant of the predictions on the processed dataset, for datasets larger than memory.
+
+        The dataset is read in chunks of self._chunksize rows. The per-trip predictions of every chunk are appended to
+        their outputs. The trips per time bucket and zone are counted per chunk and summed over all chunks, so time
+        buckets with trips in several chunks are complete before the demand per zone is predicted. The city-wide
+        demand is predicted from the demand cube, which is built chunk by chunk as well. With workers > 1, chunks are
+        predicted in worker processes, at most two per worker at a time, and written in the order of the dataset.
+        Peak memory is bounded by the chunks in flight.
+        """
+        dataset = self._get_dataset_path()
+        if not os.path.isfile(dataset):
+            print(
+                'The dataset data/processed/{} does not exist - please run preprocessing first.'.format(self._filename))
+            return
 
-        switch = {
-            '1H': 5,
-            '6H': 3,
-            '12H': 2,
-            '24H': 1
-        }
+        chunked = [(task, args) for task, args in tasks if task != 'predict_demand']
+        if chunked:
+            print('Predicting in chunks of {} rows...'.format(self._chunksize))
+            outputs = {task: io.open_prediction(self._chunk_predictions[task][1])
+                       for task, _ in chunked if task in self._chunk_predictions}
+            partials = {}
+            rows = 0
+            try:
+                for chunk_rows, results in self._map_chunks(dataset, chunked, workers):
+                    for (task, args), result in zip(chunked, results):
+                        if task in outputs:
+                            with profiling.span('append', rows_in=len(result)):
+                                outputs[task].write(result)
+                        else:
+                            partials[args] = ZoneDemand.combine(partials.get(args), result)
+                    rows += chunk_rows
+                    print('{} trips predicted...'.format(rows))
+            finally:
+                for output in outputs.values():
+                    output.close()
+            for task in outputs:
+                print('Prediction saved to', os.path.join(self._datapath, 'predicted',
+                                                          self._chunk_predictions[task][1] + '.csv'))
+
+            for (zone, resolution), partial in partials.items():
+                demand = self._get_model("model_demand_{}_{}".format(zone, resolution))
+                counts, features = demand.complete_tensor(partial)
+                self._save_zone_demand(counts, demand.predict_features(features), zone, resolution)
+
+        # all demand resolutions are rolled up from one cube
+        resolutions = [args for task, args in tasks if task == 'predict_demand']
+        if resolutions:
+            self._cube = self._get_demand_cube()
+        for args in resolutions:
+            self.predict_demand(*args)
+
+    # Yields the number of trips and the results of the tasks (see _predict_chunk) for every chunk of the processed
+    # dataset, in order.
+    def _map_chunks(self, dataset, tasks, workers):
+        chunks = (io.apply_schema(chunk, 'trips') for chunk in
+                  io.read_frame_chunks(dataset, self._chunksize, datetime_cols=['start_time', 'end_time']))
+        if workers <= 1:
+            for chunk in chunks:
+                yield len(chunk), self._predict_chunk(tasks, chunk)
+            return
 
-        poly_features = PolynomialFeatures(
-            degree=switch.get(resolution), include_bias=False)
-        X_poly = poly_features.fit_transform(X)
+        # Chunks are submitted ahead of the one that is written next, to keep all workers busy. The threads of the
+        # estimators are divided among the workers.
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(None, None, parallel.get_jobs(processes=workers))) as executor:
+            pending = deque()
+            for chunk in chunks:
+                pending.append((len(chunk), executor.submit(_predict_chunk, self._filename, tasks, chunk)))
+                if len(pending) >= 2 * workers:
+                    chunk_rows, future = pending.popleft()
+                    yield chunk_rows, future.result()
+            while pending:
+                chunk_rows, future = pending.popleft()
+                yield chunk_rows, future.result()
+
+    # Returns the results of the tasks for one chunk of trips: the predicted trips or, for the demand per zone, the
+    # partial tensor of the chunk.
+    def _predict_chunk(self, tasks, chunk):
+        results = []
+        for task, args in tasks:
+            if task == 'predict_zone_demand':
+                demand = self._get_model("model_demand_{}_{}".format(*args))
+                results.append(demand.partial_tensor(chunk))
+            else:
+                # every prediction adds its features to a shallow copy of the chunk
+                results.append(getattr(self, self._chunk_predictions[task][0])(chunk.copy(deep=False)))
+        return results
 
-        model = io.read_model("model_demand_" + resolution)
+    def _run_all(self, tasks, workers):
+        trips = self._load_trips()
+        if trips is None:
+            return
 
-        trips_demand['prediction_' + resolution] = model.predict(X_poly)
+        print('Generating shared features...')
+        with profiling.span('shared_features', rows_in=len(trips)):
+            self._add_shared_features(trips)
+            # all demand resolutions are rolled up from one cube
+            self._cube = DemandCube.from_trips(trips)
 
-        io.save_prediction(
-            trips_demand, 'demand_prediction_' + resolution)
+        if workers <= 1:
+            for task, args in tasks:
+                getattr(self, task)(*args, trips=trips)
+            return
 
-        print('Saved prediction for further evaluation.')
+        # Every worker receives the frame once on start-up instead of with every task. The threads of the estimators
+        # are divided among the workers.
+        workers = min(workers, len(tasks))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(trips, self._cube, parallel.get_jobs(processes=workers))) as executor:
+            futures = [executor.submit(_run_task, self._filename, task, args) for task, args in tasks]
+            for future in futures:
+                future.result()
 
     # Function that calculates the difference of the distances of start and end location to University of Bremen.
     # Returns the difference of the distances of the start and end location in kilometers.
@@ -501,3 +698,26 @@ class Model:
         distance = sDist - eDist
 
         return distance
+
+
+# Trips and demand cube shared with the worker processes of Model.train_all and Model.predict_all.
+_worker_trips = None
+_worker_cube = None
+
+
+def _init_worker(trips, cube, jobs):
+    global _worker_trips, _worker_cube
+    _worker_trips = trips
+    _worker_cube = cube
+    parallel.set_jobs(jobs)
+    parallel.limit_native_threads(jobs)
+
+
+def _run_task(filename, task, args):
+    model = Model(filename)
+    model._cube = _worker_cube
+    getattr(model, task)(*args, trips=_worker_trips)
+
+
+def _predict_chunk(filename, tasks, chunk):
+    return Model(filename)._predict_chunk(tasks, chunk)
@@ -0,0 +1,75 @@
+from .. import io
+from .CompiledForest import CompiledForest
+import os
+import threading
+from nextbike.io import get_model_path
+
+
+class ModelCache:
+    """
+    Keeps trained models in memory.
+
+    A model is loaded on first use and kept until its file in models/ changes. Random forests are kept as
+    CompiledForest, which predicts identically with less overhead per call. Every access compares modification
+    time and size of the file with the loaded version, so retrained models are picked up without a restart. If a
+    changed file cannot be loaded, the previously loaded version is kept.
+    """
+
+    _default = None
+
+    def __init__(self):
+        self._path = get_model_path()
+        self._models = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def default(cls):
+        """Returns a cache of the models in models/ that is shared by all callers of this process."""
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    def names(self):
+        """Returns the names of all models in models/."""
+        return sorted({os.path.splitext(file)[0] for file in os.listdir(self._path)
+                       if file.endswith('.model') or file.endswith('.pkl')})
+
+    def load_all(self):
+        """Loads every model in models/ and returns their names."""
+        names = self.names()
+        for name in names:
+            self.get(name)
+        return names
+
+    def get(self, name):
+        """Returns the model with the given name, reloading it if its file changed. Raises FileNotFoundError."""
+        stat = os.stat(io.get_model_file(name))
+        version = (stat.st_mtime_ns, stat.st_size)
+
+        cached = self._models.get(name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        with self._lock:
+            cached = self._models.get(name)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+            try:
+                model = io.read_model(name)
+                if CompiledForest.supports(model):
+                    model = CompiledForest(model)
+            except Exception as e:
+                if cached is None:
+                    raise
+                print('Could not reload {} ({}), keeping the loaded version.'.format(name, e))
+                # do not retry until the file changes again
+                self._models[name] = (version, cached[1])
+                return cached[1]
+            self._models[name] = (version, model)
+            print('Loaded model', name)
+            return model
+
+    def versions(self):
+        """Returns the metadata header of every loaded model with the modification time of the loaded version."""
+        return {name: dict(io.read_model_header(name), loaded_version=version[0] / 1e9)
+                for name, (version, _) in self._models.items()}
@@ -0,0 +1,156 @@
+from .Model import Model
+from .ModelCache import ModelCache
+from .ZoneDemand import ZoneDemand
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import json
+import os
+import socketserver
+
+
+class ModelServer:
+    """
+    Local prediction service that keeps all models of models/ in memory.
+
+    Trip records in the processed format are posted as JSON list (or as object with a "trips" list) to
+
+    * /predict/duration
+    * /predict/direction/uni
+    * /predict/direction/main_station
+    * /predict/demand/<resolution>, e.g. /predict/demand/1H
+    * /predict/demand/<zone>/<resolution> for the demand per postcode (plz) or station, e.g. /predict/demand/plz/1H
+    * /predict, for all of the above whose model exists
+
+    and the predictions are returned as JSON. Only the columns used by the respective model are required. GET /models
+    lists the loaded models. Models are reloaded as soon as their file changes, e.g. after "nextbike train".
+    """
+
+    _resolutions = ('1H', '6H', '12H', '24H')
+
+    def __init__(self, host='127.0.0.1', port=8000, socket=None):
+        self._cache = ModelCache.default()
+        self._model = Model()
+
+        # Responses are written as headers and body, so Nagle's algorithm would delay the body on TCP connections.
+        handler = type('Handler', (_Handler,), {'service': self, 'disable_nagle_algorithm': socket is None})
+        if socket is not None:
+            if os.path.exists(socket):
+                os.remove(socket)
+            self._server = _ThreadingUnixServer(socket, handler)
+            self.address = socket
+        else:
+            self._server = _ThreadingHTTPServer((host, port), handler)
+            self.address = 'http://{}:{}'.format(*self._server.server_address[:2])
+
+    def serve_forever(self):
+        print('Loaded models:', ', '.join(self._cache.load_all()) or 'none')
+        print('Serving predictions on', self.address)
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+
+    def shutdown(self):
+        self._server.shutdown()
+
+    def parse(self, records):
+        return self._model._as_frame(records)
+
+    def models(self):
+        return self._cache.versions()
+
+    def predict(self, target, trips):
+        """
+        Returns the predictions of the model(s) given by the request path target for a DataFrame of trips. Raises
+        UnknownTargetError if target names no model.
+        """
+        if target == 'duration':
+            return self._model.predict_duration_frame(trips).tolist()
+        if target == 'direction/uni':
+            return self._model.predict_direction_uni_frame(trips).tolist()
+        if target == 'direction/main_station':
+            return self._model.predict_direction_main_station_frame(trips).tolist()
+        if target.startswith('demand/') and target[len('demand/'):] in self._resolutions:
+            resolution = target[len('demand/'):]
+            demand = self._model.predict_demand_frame(trips, resolution)
+            return [{'start_time': str(time), 'prediction': prediction}
+                    for time, prediction in zip(demand.index, demand['prediction_' + resolution].tolist())]
+        if target.count('/') == 2 and target.startswith('demand/'):
+            _, zone, resolution = target.split('/')
+            if zone in ZoneDemand.zone_columns and resolution in self._resolutions:
+                demand = self._model.predict_zone_demand_frame(trips, zone, resolution).stack().rename('prediction')
+                demand = demand.reset_index().astype({'start_time': str})
+                # through JSON, so zones and predictions are converted to plain numbers
+                return json.loads(demand.to_json(orient='records', double_precision=15))
+        if target == '':
+            available = set(self._cache.names())
+            targets = [('duration', 'model_duration'), ('direction/uni', 'model_direction_uni'),
+                       ('direction/main_station', 'model_direction_main_station')] + \
+                      [('demand/' + resolution, 'model_demand_' + resolution) for resolution in self._resolutions]
+            return {path.replace('/', '_'): self.predict(path, trips) for path, name in targets if name in available}
+        raise UnknownTargetError(target)
+
+
+class UnknownTargetError(LookupError):
+    """Raised by ModelServer.predict for a request path that names no model."""
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    # keep connections open between requests of a client
+    protocol_version = 'HTTP/1.1'
+    service = None
+
+    def _reply(self, status, body):
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/models':
+            self._reply(200, self.service.models())
+        else:
+            self._reply(404, {'error': 'Unknown path ' + self.path})
+
+    def do_POST(self):
+        path = self.path.rstrip('/')
+        if path != '/predict' and not path.startswith('/predict/'):
+            self._reply(404, {'error': 'Unknown path ' + self.path})
+            return
+
+        try:
+            records = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            if isinstance(records, dict):
+                records = records['trips']
+            trips = self.service.parse(records)
+        except (ValueError, KeyError, TypeError) as e:
+            self._reply(400, {'error': 'Expected a JSON list of trip records ({})'.format(e)})
+            return
+
+        try:
+            self._reply(200, {'predictions': self.service.predict(path[len('/predict/'):], trips)})
+        except UnknownTargetError:
+            self._reply(404, {'error': 'Unknown model ' + self.path})
+        except KeyError as e:
+            self._reply(400, {'error': 'Missing trip attribute {}'.format(e)})
+        except FileNotFoundError as e:
+            self._reply(503, {'error': 'Model not trained ({})'.format(e.filename)})
+        except Exception as e:
+            self._reply(500, {'error': '{}: {}'.format(type(e).__name__, e)})
+
+    def address_string(self):
+        # Unix socket clients have no address.
+        return self.client_address[0] if self.client_address else 'local'
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
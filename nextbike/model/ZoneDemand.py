@@ -0,0 +1,131 @@
+from .features import demand_values, DEMAND_DEGREES, DEMAND_FEATURES
+import numpy as np
+import pandas as pd
+
+
+class ZoneDemand:
+    """
+    Demand model of all zones of a city, either postcodes (start_plz) or stations (start_place), at one resolution.
+
+    Trips are counted into a (time bucket x zone) matrix in one pass. Like the city-wide demand model, every bucket is
+    described by the mean month, hour, temperature and rain duration of its trips, expanded to polynomial features.
+    These features are the same for all zones, so the regressions of all zones are fitted as one multi-output least
+    squares problem and predicted by one matrix product, instead of one model per zone.
+
+    Trips that did not start at a station (start_place 0) or without postcode are not counted as demand of a zone.
+    """
+
+    zone_columns = {
+        'plz': 'start_plz',
+        'station': 'start_place'
+    }
+
+    def __init__(self, zone='plz', resolution='1H'):
+        if zone not in self.zone_columns:
+            raise ValueError('Unknown zone {} - use one of {}.'.format(zone, ', '.join(self.zone_columns)))
+        if resolution not in DEMAND_DEGREES:
+            raise ValueError('Unknown resolution {} - use one of {}.'.format(resolution, ', '.join(DEMAND_DEGREES)))
+        self.zone = zone
+        self.resolution = resolution
+        self.zones = None
+        self._regression = None
+
+    def _bucket_sums(self, trips):
+        """
+        Returns the bucket of every trip as code into the sorted buckets with trips and the number of trips and the
+        sums of the demand features per bucket.
+        """
+        start_time = trips['start_time']
+        codes, buckets = pd.factorize(start_time.dt.floor(self.resolution), sort=True)
+
+        values = demand_values(trips)
+        sums = {'trips': np.bincount(codes, minlength=len(buckets))}
+        for name in DEMAND_FEATURES:
+            sums[name + '_sum'] = np.bincount(codes, weights=values[name], minlength=len(buckets))
+        return codes, pd.DataFrame(sums, index=pd.DatetimeIndex(buckets, name='start_time'))
+
+    @staticmethod
+    def _means(sums):
+        return pd.DataFrame({name: sums[name + '_sum'] / sums['trips'] for name in DEMAND_FEATURES},
+                            index=sums.index)
+
+    def _bucket_features(self, trips):
+        """
+        Returns the bucket of every trip as code into the sorted buckets with trips and the demand features per
+        bucket.
+        """
+        codes, sums = self._bucket_sums(trips)
+        return codes, self._means(sums)
+
+    def _polynomial(self, features):
+        from sklearn.preprocessing import PolynomialFeatures
+        return PolynomialFeatures(degree=DEMAND_DEGREES[self.resolution], include_bias=False).fit_transform(features)
+
+    def tensor(self, trips, zones=None):
+        """
+        Returns the number of trips per time bucket and zone as DataFrame (buckets x zones) and the demand features
+        per bucket. Only buckets with at least one trip are included. Without zones, all zones of the trips are used.
+        """
+        codes, sums = self._bucket_sums(trips)
+        return self._count(trips, codes, sums.index, zones), self._means(sums)
+
+    def partial_tensor(self, trips):
+        """
+        Returns the number of trips per time bucket and trained zone and the number of trips and sums of the demand
+        features per bucket, for one batch of the trips. Both are sums, so the partial tensors of several batches are
+        combined by adding them (see combine), also in time buckets with trips in more than one batch.
+        """
+        codes, sums = self._bucket_sums(trips)
+        return self._count(trips, codes, sums.index, self.zones), sums
+
+    @staticmethod
+    def combine(partial, other):
+        """Returns the sum of two partial tensors, the first one may be None."""
+        if partial is None:
+            return other
+        return tuple(left.add(right, fill_value=0).astype(left.dtypes) for left, right in zip(partial, other))
+
+    def complete_tensor(self, partial):
+        """Returns the tensor (as returned by tensor) of the sum of the partial tensors of all batches of trips."""
+        counts, sums = partial
+        return counts.sort_index(), self._means(sums.sort_index())
+
+    def _count(self, trips, codes, buckets, zones):
+        # missing postcodes become 0, like trips that did not start at a station
+        values = trips[self.zone_columns[self.zone]].to_numpy(dtype=np.int64, na_value=0)
+        if zones is None:
+            zones = np.unique(values[values != 0])
+
+        # Zones are found by binary search, trips of other zones are not counted.
+        position = np.searchsorted(zones, values).clip(0, max(len(zones) - 1, 0))
+        known = (zones[position] == values) if len(zones) else np.zeros(len(values), dtype=bool)
+
+        counts = np.bincount(codes[known] * len(zones) + position[known], minlength=len(buckets) * len(zones))
+        return pd.DataFrame(counts.reshape(len(buckets), len(zones)), index=buckets,
+                            columns=pd.Index(zones, name=self.zone))
+
+    def fit(self, trips):
+        from sklearn.linear_model import LinearRegression
+
+        counts, features = self.tensor(trips)
+        self.zones = counts.columns.to_numpy()
+        self._regression = LinearRegression().fit(self._polynomial(features), counts.to_numpy())
+        return self
+
+    def predict(self, trips):
+        """
+        Returns the predicted number of trips per time bucket (with trips) and trained zone, as DataFrame
+        (buckets x zones).
+        """
+        _, features = self._bucket_features(trips)
+        return self.predict_features(features)
+
+    def predict_features(self, features):
+        """
+        Returns the predicted number of trips per time bucket and trained zone for the demand features per bucket, as
+        returned by tensor.
+        """
+        if self._regression is None:
+            raise ValueError('The model has to be fitted before predicting.')
+        predictions = self._regression.predict(self._polynomial(features)).reshape(len(features), len(self.zones))
+        return pd.DataFrame(predictions, index=features.index, columns=pd.Index(self.zones, name=self.zone))
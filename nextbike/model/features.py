@@ -0,0 +1,50 @@
+import numpy as np
+
+
+# approximate radius of earth in km
+EARTH_RADIUS = 6373.0
+
+# Points of interest as (longitude, latitude).
+UNIVERSITY = (8.8499603, 53.1069302)
+MAIN_STATION = (8.813717, 53.083122)
+
+# Features of the demand models, aggregated per time bucket, and the degree of their polynomial per resolution.
+DEMAND_FEATURES = ['month', 'hour', 'temp_2m', 'min']
+DEMAND_DEGREES = {
+    '1H': 5,
+    '6H': 3,
+    '12H': 2,
+    '24H': 1
+}
+
+
+def demand_values(trips):
+    """Returns the values of the demand features of every trip, which are averaged per time bucket."""
+    start_time = trips['start_time']
+    return {'month': start_time.dt.month, 'hour': start_time.dt.hour, 'temp_2m': trips['temp_2m'], 'min': trips['min']}
+
+
+def haversine(lng, lat, poi_lng, poi_lat):
+    """
+    Great-circle distance in kilometers between coordinates given in degrees. Inputs are broadcast against each other.
+    """
+    lng, lat, poi_lng, poi_lat = map(np.radians, (lng, lat, poi_lng, poi_lat))
+
+    a = np.sin((poi_lat - lat) / 2)**2 + np.cos(lat) * np.cos(poi_lat) * np.sin((poi_lng - lng) / 2)**2
+    return EARTH_RADIUS * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def distance_towards(trips, pois):
+    """
+    Calculates for every trip how much closer its end location is to each point of interest than its start location.
+
+    Returns an array of shape (number of trips, number of pois) in kilometers. If a value is positive, the trip moved
+    towards the point of interest.
+    """
+    poi_lng, poi_lat = np.asarray(pois, dtype=float).reshape(-1, 2).T
+
+    start = haversine(trips['start_lng'].to_numpy()[:, None], trips['start_lat'].to_numpy()[:, None],
+                      poi_lng, poi_lat)
+    end = haversine(trips['end_lng'].to_numpy()[:, None], trips['end_lat'].to_numpy()[:, None],
+                    poi_lng, poi_lat)
+    return start - end
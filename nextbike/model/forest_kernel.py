@@ -0,0 +1,35 @@
+import numba
+from numba import njit, prange
+import numpy as np
+
+# Rows traversed together. Stepping a block of rows through one tree level at a time keeps the loads of their nodes
+# independent of each other, instead of waiting for every node before loading the next one.
+BLOCK_ROWS = 256
+
+
+@njit(parallel=True, cache=True)
+def _traverse(X, roots, feature, threshold, children, value, depth, out):
+    n_rows = X.shape[0]
+    for block in prange((n_rows + BLOCK_ROWS - 1) // BLOCK_ROWS):
+        start = block * BLOCK_ROWS
+        end = min(start + BLOCK_ROWS, n_rows)
+        nodes = np.empty(end - start, dtype=np.intp)
+        for tree in range(roots.shape[0]):
+            nodes[:] = roots[tree]
+            for _ in range(depth):
+                for i in range(end - start):
+                    node = nodes[i]
+                    nodes[i] = children[2 * node + (X[start + i, feature[node]] > threshold[node])]
+            # trees are added in the order of the forest
+            for i in range(end - start):
+                for c in range(value.shape[1]):
+                    out[start + i, c] += value[nodes[i], c]
+
+
+def traverse(X, roots, feature, threshold, children, value, depth, out, jobs=1):
+    """
+    Adds the values of the leaves every row of X reaches in every tree to out, with the node arrays of
+    CompiledForest. Blocks of rows are divided among the given number of threads.
+    """
+    numba.set_num_threads(max(1, min(jobs, numba.config.NUMBA_NUM_THREADS)))
+    _traverse(X, roots, feature, threshold, children, value, depth, out)
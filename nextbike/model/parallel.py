@@ -0,0 +1,67 @@
+import os
+
+# Environment variable with the number of threads used by estimators, if not set by set_jobs.
+JOBS_ENV = 'NEXTBIKE_JOBS'
+
+_jobs = None
+
+
+def available_cpus():
+    """Returns the number of CPUs this process may run on."""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def set_jobs(jobs):
+    """
+    Sets the number of threads every estimator fits and predicts with. -1 uses all available CPUs, None falls back to
+    the environment variable NEXTBIKE_JOBS or a single thread.
+    """
+    global _jobs
+    if jobs is not None and jobs != -1 and jobs < 1:
+        raise ValueError('The number of jobs has to be positive or -1 for all CPUs, got {}.'.format(jobs))
+    _jobs = jobs
+
+
+def get_jobs(processes=1):
+    """
+    Returns the number of threads an estimator may use, if the CPUs are shared by the given number of processes.
+
+    The setting is capped at the available CPUs and divided among the processes, so parallel processes and the
+    threads of their estimators do not oversubscribe the CPUs.
+    """
+    jobs = _jobs
+    if jobs is None:
+        jobs = _env_jobs()
+    cpus = available_cpus()
+    if jobs == -1 or jobs > cpus:
+        jobs = cpus
+    return max(1, jobs // max(1, processes))
+
+
+def _env_jobs():
+    # an empty variable counts as unset, like on the command line
+    value = os.environ.get(JOBS_ENV, '').strip()
+    if not value:
+        return 1
+    try:
+        jobs = int(value)
+    except ValueError:
+        jobs = 0
+    if jobs != -1 and jobs < 1:
+        raise ValueError('The environment variable {} has to be a positive number of jobs or -1 for all CPUs, got '
+                         '{!r}.'.format(JOBS_ENV, value))
+    return jobs
+
+
+def limit_native_threads(jobs):
+    """
+    Limits the thread pools of native libraries (BLAS, OpenMP) of this process to the given number of threads, so they
+    do not multiply with the threads of the estimators. Needs threadpoolctl, which is installed with scikit-learn.
+    """
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return
+    threadpool_limits(limits=jobs)
@@ -0,0 +1,67 @@
+import geopandas as gpd
+import numpy as np
+import os
+import pandas as pd
+from nextbike.io import get_data_path
+
+# The spatial index queries arrays of geometries with query from geopandas 0.12 on, which deprecates query_bulk.
+_QUERY_ARRAYS = tuple(int(part) for part in gpd.__version__.split('.')[:2]) >= (0, 12)
+
+
+class PlzLookup:
+    """
+    Assigns postcodes (PLZ) of Bremen to coordinates.
+
+    Bikes park at a limited set of coordinates, so coordinates are deduplicated first. Only the unique coordinates are
+    matched against the postcode polygons through the spatial index of the polygons, which is built once per lookup
+    and reused by every call. The postcodes are then broadcast back to all rows.
+    """
+
+    _default = None
+
+    def __init__(self, plz_df=None):
+        if plz_df is None:
+            plz_df = gpd.read_file(os.path.join(get_data_path(), 'external', 'plz_bremen.geojson'))
+        self._polygons = plz_df.geometry.reset_index(drop=True)
+        self._plz = pd.to_numeric(plz_df['plz']).to_numpy(dtype=float)
+        self._sindex = None
+
+    @classmethod
+    def default(cls):
+        """Returns a lookup over data/external/plz_bremen.geojson that is shared by all callers of this process."""
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    def _get_sindex(self):
+        if self._sindex is None:
+            self._sindex = self._polygons.sindex
+        return self._sindex
+
+    def lookup(self, lng, lat):
+        """
+        Returns the postcode of the polygon each coordinate lies within as float array, NaN for coordinates outside
+        of all polygons. If polygons overlap, the first one in the postcode file wins.
+        """
+        lng = np.asarray(lng, dtype=float)
+        lat = np.asarray(lat, dtype=float)
+
+        # A complex number holds both coordinates, so pairs can be factorized in one pass.
+        codes, unique = pd.factorize(lng + 1j * lat)
+        points = gpd.points_from_xy(unique.real, unique.imag)
+
+        sindex = self._get_sindex()
+        if _QUERY_ARRAYS:
+            point_idx, polygon_idx = sindex.query(points, predicate='within')
+        else:
+            point_idx, polygon_idx = sindex.query_bulk(points, predicate='within')
+
+        # Keep the first polygon per point if a point lies within several.
+        order = np.lexsort((polygon_idx, point_idx))
+        point_idx, polygon_idx = point_idx[order], polygon_idx[order]
+        first = np.ones(len(point_idx), dtype=bool)
+        first[1:] = point_idx[1:] != point_idx[:-1]
+
+        unique_plz = np.full(len(unique), np.nan)
+        unique_plz[point_idx[first]] = self._plz[polygon_idx[first]]
+        return unique_plz[codes]
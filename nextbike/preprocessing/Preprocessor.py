@@ -1,442 +1,446 @@
-from .. import io
-import datetime
-import geopandas as gpd
+from .. import io, profiling
+from .trips import attach_weather, build_trips_parallel
+from .TripFilter import TripFilter
+from .WeatherStore import WeatherStore
+from ..model.DemandCube import DemandCube
 import numpy as np
 import os
 import pandas as pd
-import requests
-from tqdm import tqdm
+import tempfile
 from nextbike.io import get_data_path
 
 
 class Preprocessor:
 
+    _raw = None
+    _plz_lookup = None
     _cleaned = None
-    _trips = []
+    _trips = None
     _filename = ''
 
-    def __init__(self, filename, refresh=False):
+    # Stages of run() and the intermediate dataset that lets them be skipped (None: the weather store).
+    _stages = {
+        'clean_dataset': 'cleaned',
+        'create_trips': 'trips',
+        'prepWeather': None,
+        'mergeWeatherTrips': 'final'
+    }
+
+    def __init__(self, filename, refresh=False, chunksize=None, partitions=16, workers=1, weather_tolerance='30min',
+                 checkpoints=True):
         self._refresh = refresh
+        self._checkpoints = checkpoints
         self._filename = filename
         self._prettyfilename = filename.replace('.csv', '')
         self._datapath = get_data_path()
-        self._raw = io.read_file(path=os.path.join(
-            self._datapath, 'raw/' + filename), datetime_cols=['datetime'])
-        self.plz_df = gpd.read_file(
-            self._datapath + '/external/plz_bremen.geojson')
+        self._chunksize = chunksize
+        self._partitions = partitions
+        self._workers = workers
+        self._weather_tolerance = weather_tolerance
+        self._rawpath = os.path.join(self._datapath, 'raw/' + filename)
+        self._weather = WeatherStore(self._datapath)
+
+    # The raw pings and the postcode polygons are loaded on first use, so stages that are skipped do not read them. In
+    # streaming mode the raw pings are read chunk by chunk during cleaning instead.
+    def _get_raw(self):
+        if self._raw is None:
+            with profiling.span('load_raw'):
+                self._raw = io.read_file(path=self._rawpath, datetime_cols=['datetime'], schema='pings')
+        return self._raw
+
+    def _get_plz_lookup(self):
+        if self._plz_lookup is None:
+            # geopandas is imported on use as well
+            from .PlzLookup import PlzLookup
+            with profiling.span('load_plz'):
+                self._plz_lookup = PlzLookup.default()
+        return self._plz_lookup
+
+    def _intermediateexists_for(self, name, step):
+        return os.path.isfile(io.with_format(os.path.join(self._datapath, 'processed', name + '_' + step)))
 
     def _intermediateexists(self, step):
         try:
-            if step == 'weather':
-                path = os.path.join(self._datapath, 'external',
-                                    self._prettyfilename+'_' + step + '.gz')
-            elif step == 'final':
-                path = os.path.join(self._datapath, 'processed',
-                                    self._filename)
+            if step == 'final':
+                path = io.with_format(os.path.join(self._datapath, 'processed',
+                                                   self._filename))
             else:
-                path = os.path.join(self._datapath, 'processed',
-                                    self._prettyfilename+'_' + step + '.csv')
+                path = io.with_format(os.path.join(self._datapath, 'processed',
+                                                   self._prettyfilename+'_' + step))
             if os.path.isfile(path):
                 return True
         except FileNotFoundError:
             return False
 
+    def _runs(self, stage):
+        """Returns whether a stage of run() is executed, i.e. refresh is given or its output does not exist yet."""
+        if self._refresh:
+            return True
+        if self._stages[stage] is None:
+            return not self._weather.exists()
+        return not self._intermediateexists(self._stages[stage])
+
+    def plan(self):
+        """Returns for every stage of run(), in order, whether it is executed (True) or skipped (False)."""
+        return {stage: self._runs(stage) for stage in self._stages}
+
+    @profiling.profiled
     def clean_dataset(self):
 
-        if self._intermediateexists('cleaned') and not self._refresh:
+        if not self._runs('clean_dataset'):
             print('An intermediate cleaned Dataset exists. Skipping...')
             print('If you want to force re-run of preprocessing and transformation, provide the -r/--refresh option.\n')
             return
 
-        print('Cleaning data set...')
-
-        # Drop unnecessary columns.
-        self._raw.drop(columns=['Unnamed: 0'], inplace=True)
+        if self._chunksize is not None:
+            self._clean_dataset_chunked()
+            return
 
-        # Filter exclusively for data points inside boundaries of Bremen.
-        self._raw = self._raw[(self._raw['p_lat'] < 53.228967) &
-                              (self._raw['p_lat'] > 53.011037) &
-                              (self._raw['p_lng'] < 8.990582) &
-                              (self._raw['p_lng'] > 8.481593)]
+        print('Cleaning data set...')
 
-        # Create geopandas data frames from data frames
         print('Filtering for city of Bremen. This can take some time depending on the computational power of your '
               'device.')
-        self._raw = gpd.GeoDataFrame(self._raw, geometry=gpd.points_from_xy(self._raw.p_lng.copy(),
-                                                                            self._raw.p_lat.copy()))
-        self._raw.crs = "EPSG:4326"
-
-        self._raw = gpd.sjoin(
-            self._raw, self.plz_df[['geometry', 'plz']], how='left', op='within')
-
-        # Drop null values which include all data points outside of Bremens boundaries
-        self._raw = self._raw.drop(columns=['index_right']).dropna()
-
+        self._raw = self._clean_chunk(self._get_raw())
         print('Filtered for city of Bremen.')
 
         # Drop duplicates with key datetime and bike number
-        self._raw = self._raw[self._raw.duplicated(
-            subset=['datetime', 'b_number'], keep='first') == False]
+        with profiling.span('dedup', rows_in=len(self._raw)) as span:
+            self._raw = self._raw[self._raw.duplicated(
+                subset=['datetime', 'b_number'], keep='first') == False]
+            span.rows_out = len(self._raw)
         print('Duplicates of subset [datetime, bike number] dropped.')
 
-        # Reset index to be improve its interpretability
-        self._raw = self._raw.reset_index().drop(columns=['index'])
-        print('Index reset.')
-
-        # Rearange order of columns in a more intuitive order.
-        self._raw = self._raw[['datetime', 'b_number', 'b_bike_type', 'p_spot', 'p_place_type',
-                               'trip', 'p_uid', 'p_bikes', 'p_name',
-                               'p_number', 'p_bike', 'p_lat', 'p_lng', 'plz']]
-        print('Order of columns rearranged.')
-
-        # Drop null values
-        self._raw.dropna(inplace=True)
-        print('Null values dropped.')
-
-        # Sort data by timestamp
-        self._raw['datetime'] = pd.to_datetime(
-            self._raw['datetime'])  # parse timestamp to datetime
-        self._raw = self._raw.sort_values('datetime')
-
-        # Save cleaned data set as csv in data/preprocessed.
-        print('Saving intermediate DataFrame in data/processed as {}_cleaned.csv.'.format(self._prettyfilename))
-        io.save_df(self._raw, self._prettyfilename+'_cleaned')
-        print('Cleaning data sucessfully finished.\n\n')
-
-    def _get_cleaned(self):
-        return io.read_file(path=os.path.join(self._datapath, 'processed/{}_cleaned.csv'.format(self._prettyfilename)),
-                            datetime_cols=['datetime'])
-
-    def _write_trip(self, ping, buffer):
-        trip = {'bike': ping['b_number'],
-                'bike_type': ping['b_bike_type'],
-                'identification': ping['p_uid'],
-                'start_time': buffer['datetime'],
-                'end_time': ping['datetime'],
-                'weekend': (0 if (buffer['datetime'].weekday() < 5) else 1),
-                'duration_sec': (ping['datetime'] - buffer['datetime']).total_seconds(),
-                'start_lng': buffer['p_lng'],
-                'start_lat': buffer['p_lat'],
-                'end_lng': ping['p_lng'],
-                'end_lat': ping['p_lat'],
-                'start_place': buffer['p_number'],
-                'end_place': ping['p_number'],
-                'start_plz': buffer['plz'],
-                'end_plz': ping['plz']
-                }
-
-        self._trips.append(trip)
-
-    def create_trips(self):
-
-        if self._intermediateexists('trips') and not self._refresh:
-            print('An intermediate Trips Dataset exists. Skipping...')
-            print('If you want to force re-run of preprocessing and transformation, provide the -r/--refresh option.\n')
-            return
+        # Sort data by bike number and timestamp, the order trips are built in, and reset the index to improve its
+        # interpretability
+        with profiling.span('sort', rows_in=len(self._raw)):
+            self._raw = self._raw.sort_values(['b_number', 'datetime']).reset_index(drop=True)
 
-        print('Creating Trips from cleaned bike pings...')
+        # The cleaned pings are handed to create_trips in memory.
+        self._cleaned = self._raw
+        print('Cleaned pings take {:.1f} MB in memory.'.format(io.memory_mb(self._cleaned)))
 
-        self._cleaned = self._get_cleaned()
-        ordered = self._cleaned.sort_values(['b_number', 'datetime'], axis=0)
+        # Save cleaned data set in the configured storage format in data/preprocessed.
+        if self._checkpoints:
+            print('Saving intermediate DataFrame in data/processed as {}_cleaned{}.'.format(
+                self._prettyfilename, io.with_format('')))
+            io.save_df(self._cleaned, self._prettyfilename+'_cleaned')
+        print('Cleaning data sucessfully finished.\n\n')
 
-        buffer = None
+    def _clean_chunk(self, raw):
+        """
+        Applies all cleaning steps that work row by row to raw pings: the bounding box filter, the PLZ join and the
+        column projection. Deduplication and sorting need the whole dataset and are left to the caller.
+        """
 
-        for index, ping in tqdm(ordered.iterrows(), total=len(ordered), desc='Finished rows:'):
+        # Drop unnecessary columns.
+        raw = raw.drop(columns=['Unnamed: 0'])
 
-            bike = ping['b_number']
-            trip = ping['trip']
-            time = ping['datetime']
-            lat = ping['p_lat']
-            lng = ping['p_lng']
+        # Filter exclusively for data points inside boundaries of Bremen.
+        with profiling.span('bounding_box', rows_in=len(raw)) as span:
+            raw = raw[(raw['p_lat'] < 53.228967) &
+                      (raw['p_lat'] > 53.011037) &
+                      (raw['p_lng'] < 8.990582) &
+                      (raw['p_lng'] > 8.481593)]
+            span.rows_out = len(raw)
 
-            if buffer is not None:
+        # Assign postcodes through the spatial index, data points outside of Bremens boundaries get none
+        with profiling.span('plz_join', rows_in=len(raw)):
+            raw = raw.assign(plz=self._get_plz_lookup().lookup(raw['p_lng'], raw['p_lat']))
 
-                buffer_bike = buffer['b_number']
-                if bike != buffer_bike:
-                    # if records of the next bike start, overwrite buffer and continue
-                    buffer = ping
-                    continue
+        # Drop null values which include all data points outside of Bremens boundaries
+        with profiling.span('dropna', rows_in=len(raw)) as span:
+            raw = raw.dropna()
+            span.rows_out = len(raw)
 
-                buffer_trip = buffer['trip']
-                buffer_time = buffer['datetime']
-                buffer_lat = buffer['p_lat']
-                buffer_lng = buffer['p_lng']
+        # Rearange order of columns in a more intuitive order.
+        raw = raw[['datetime', 'b_number', 'b_bike_type', 'p_spot', 'p_place_type',
+                   'trip', 'p_uid', 'p_bikes', 'p_name',
+                   'p_number', 'p_bike', 'p_lat', 'p_lng', 'plz']]
+
+        # Store enumerations as categoricals, integers in compact types and postcodes as whole numbers.
+        return io.apply_schema(raw, 'pings')
+
+    def _clean_dataset_chunked(self):
+        """
+        Streaming variant of clean_dataset for raw files larger than memory.
+
+        Raw pings are read in chunks of self._chunksize rows and cleaned chunk by chunk. The cleaned pings are
+        partitioned by bike number into temporary files, so all pings sharing a [datetime, bike number] key end up in
+        the same partition, in the order of the raw file. Each partition is then deduplicated, sorted by bike number and
+        timestamp and appended to the output. Peak memory is bounded by one chunk plus one partition.
+        """
+        print('Cleaning data set in chunks of {} rows...'.format(self._chunksize))
+
+        path = io.with_format(os.path.join(self._datapath, 'processed', self._prettyfilename + '_cleaned'))
+        rows_in = rows_out = 0
+        # opened first, so a storage format that cannot be written in chunks fails before any data is read
+        output = io.open_appender(path)
+        empty = None
+
+        with tempfile.TemporaryDirectory(dir=os.path.join(self._datapath, 'processed')) as partitiondir:
+            partitions = [io.open_appender(os.path.join(partitiondir, 'part-{}.csv'.format(i)))
+                          for i in range(self._partitions)]
+
+            for chunk in io.read_frame_chunks(self._rawpath, self._chunksize, datetime_cols=['datetime']):
+                rows_in += len(chunk)
+                chunk = self._clean_chunk(chunk)
+                if empty is None:
+                    empty = chunk.iloc[:0]
+                for i, partition in chunk.groupby(chunk['b_number'] % self._partitions):
+                    partitions[i].write(partition)
+                print('{} raw pings read...'.format(rows_in))
+
+            for partition in partitions:
+                partition.close()
+            print('Filtered for city of Bremen.')
+
+            try:
+                for i in range(self._partitions):
+                    partitionpath = os.path.join(partitiondir, 'part-{}.csv'.format(i))
+                    if not os.path.isfile(partitionpath):
+                        continue
+                    # with the dtypes of clean_dataset, which the csv partitions do not keep
+                    partition = io.read_file(path=partitionpath, datetime_cols=['datetime'], schema='pings')
+
+                    # Drop duplicates with key datetime and bike number
+                    with profiling.span('dedup', rows_in=len(partition)) as span:
+                        partition = partition[~partition.duplicated(subset=['datetime', 'b_number'], keep='first')]
+                        span.rows_out = len(partition)
+                    with profiling.span('sort', rows_in=len(partition)):
+                        partition = partition.sort_values(['b_number', 'datetime'])
+
+                    output.write(partition)
+                    rows_out += len(partition)
+
+                # like clean_dataset, no remaining pings still give a cleaned dataset, without rows
+                if rows_out == 0 and empty is not None:
+                    output.write(empty)
+            finally:
+                output.close()
 
-                if trip == 'first' and buffer_trip == 'last':
-                    # check for midnight trip
-                    if buffer_time.time() != datetime.time(23, 59) and time.time() != datetime.time(0, 0):
+        print('Duplicates of subset [datetime, bike number] dropped.')
+        print('{} of {} pings remaining.'.format(rows_out, rows_in))
+        print('Intermediate DataFrame saved in data/processed as {}_cleaned{}.'.format(
+            self._prettyfilename, io.with_format('')))
+        print('Cleaning data sucessfully finished.\n\n')
 
-                        # this was not just a checkout/checkin ping
-                        # now check if the bike has moved
-                        moved = (lat != buffer_lat) | (lng != buffer_lng)
-                        if moved:
-                            self._write_trip(ping, buffer)
-                            buffer = None
+    def _get_cleaned(self):
+        return io.read_file(path=io.with_format(os.path.join(self._datapath, 'processed/{}_cleaned'.format(self._prettyfilename))),
+                            datetime_cols=['datetime'], schema='pings')
 
-                elif trip == 'end' and buffer_trip == 'start':
-                    # write trip, discard buffer and continue
-                    self._write_trip(ping, buffer)
-                    buffer = None
+    @profiling.profiled
+    def create_trips(self):
 
-                buffer = ping
+        if not self._runs('create_trips'):
+            print('An intermediate Trips Dataset exists. Skipping...')
+            print('If you want to force re-run of preprocessing and transformation, provide the -r/--refresh option.\n')
+            return
 
-            else:
-                if trip == 'last' or trip == 'start':
-                    # only write buffer and start a potential trip with last and start trip attribute
-                    buffer = ping
+        print('Creating Trips from cleaned bike pings...')
 
-        self._trips = pd.DataFrame.from_records(self._trips)
+        if self._cleaned is None:
+            self._cleaned = self._get_cleaned()
+        with profiling.span('build_trips', rows_in=len(self._cleaned)) as span:
+            self._trips = io.apply_schema(build_trips_parallel(self._cleaned, self._workers), 'trips')
+            span.rows_out = len(self._trips)
         print('created', len(self._trips), 'trips.')
+        print('Trips take {:.1f} MB in memory.'.format(io.memory_mb(self._trips)))
 
-        # Drop all trips with duration over 24h
-        self._trips = self._trips[self._trips['duration_sec'] < (24*60*60)]
-        print('Droped all trips with duration over 24h.')
-
-        # Drop round trips - trips with no differences in both start/end lng and start/end lat that are not station-bound
-        print('removing round trips that are obviously not real...')
-        self._trips = self._trips[~((self._trips['start_lng'] == self._trips['end_lng']) &
-                                    (self._trips['start_lat'] == self._trips['end_lat']) &
-                                    (self._trips['start_place'] == 0) & (self._trips['end_place'] == 0))]
-
-        print(len(self._trips), 'trips remaining...')
-
-        # Drop remaining round trips that are shorter (or =) 7 minutes
-        print('removing sub-7 round trips...')
-        self._trips = self._trips[~((self._trips['start_lng'] == self._trips['end_lng']) & (
-            self._trips['start_lat'] == self._trips['end_lat']) & (self._trips['duration_sec'] <= 420))]
-
-        print(len(self._trips), 'trips remaining...')
-
-        # drop round trips on days that deviate more than 3 std variations away from the median (more robust than the mean)
-        print('removing trips on days that deviate 3 std away from the median of trips per day...')
-        tripsperday = self._trips[(self._trips['start_lng'] == self._trips['end_lng']) & (
-            self._trips['start_lat'] == self._trips['end_lat'])].resample('D', on='start_time').agg({'bike': 'count'}).reset_index()
-        cutoff = tripsperday.std().values[0] * 3
-        tripsmean = tripsperday.median().values[0]
-        dropdays = tripsperday[tripsperday['bike'] > tripsmean +
-                               cutoff]['start_time'].dt.strftime('%Y-%m-%d')
-        self._trips = self._trips[~((self._trips['start_time'].dt.strftime('%Y-%m-%d').isin(dropdays)) & (
-            self._trips['start_lng'] == self._trips['end_lng']) & (self._trips['start_lat'] == self._trips['end_lat']))]
-        print(len(self._trips), 'trips remaining...')
-
-        # drop trips that duplicate perfectly over start_time and end_time and when this happens > 10
-        print('removing trips that duplicate perfectly on start and end time...')
-        duplicates = self._trips.duplicated(
-            subset=['start_time', 'end_time'], keep=False)
-        n_duplicates = self._trips[duplicates].groupby(['start_time', 'end_time']).agg(
-            {'bike': 'count'}).reset_index().rename({'bike': 'count'}, axis=1)
-        drop_starttimes = n_duplicates[n_duplicates['count']
-                                       < 10]['start_time']
-        self._trips = self._trips[~(
-            self._trips['start_time'].isin(drop_starttimes))]
-
-        print(len(self._trips), 'trips remaining.')
-
-        # finally fill na values with zeros
-        self._trips.fillna(0, inplace=True)
-
-        # Save trips data set as csv in data/preprocessed.
-        print('Saving intermediate DataFrame in data/processed as {}_trips.csv.'.format(self._prettyfilename))
-        io.save_df(self._trips, self._prettyfilename+'_trips')
-        print('Creating trips from data completed successfully.\n\n')
-
-    def _get_trips(self):
-        return io.read_file(path=os.path.join(self._datapath, 'processed/{}_trips.csv'.format(self._prettyfilename)),
-                            datetime_cols=['start_time', 'end_time'])
-
-    def _saveDwdData(self, url, path, f_name):
-
-        # print('Download ' + f_name + ' from ' + url + ' and save to ' + path)
-
-        file = requests.get(url)
-        open(path + f_name, 'wb').write(file.content)
-        file.close()
-
-    def _getDwdData(self, url, path, f_name):
-
-        self._saveDwdData(url, path, f_name)
-
-        df = pd.read_csv(path + f_name, sep=';')
-        # print('Created data frame of ' + f_name)
-
-        os.remove(path + f_name)
-        # print('Zip file removed: ' + path + f_name)
+        self._trips, _ = self._filter_trips(self._trips)
 
-        return df
-
-    def _filterForYears(self, df):
-
-        df.rename(columns={"MESS_DATUM": "timestamp"}, inplace=True)
-
-        df['timestamp'] = pd.to_datetime(df['timestamp'].astype(str))
+        # Save trips data set in the configured storage format in data/preprocessed.
+        if self._checkpoints:
+            print('Saving intermediate DataFrame in data/processed as {}_trips{}.'.format(
+                self._prettyfilename, io.with_format('')))
+            io.save_df(self._trips, self._prettyfilename+'_trips')
+        print('Creating trips from data completed successfully.\n\n')
 
-        df.set_index('timestamp', inplace=True)
+    @profiling.profiled
+    def _filter_trips(self, trips, history=None):
+        """
+        Drops implausible trips. history optionally holds the number of round trips per day of former runs, which is
+        taken into account for the anomalous-day filter. Returns the remaining trips and the updated round trips per day.
+        """
+        tripfilter = TripFilter()
+        trips, tripsperday = tripfilter.apply(trips, history)
+        for rule, description in tripfilter.rules.items():
+            print('Dropped {} {}.'.format(tripfilter.dropped[rule], description))
+        print(len(trips), 'trips remaining.')
 
-        df = df[df.index.year >= 2018]
+        return trips, tripsperday
 
-        return df
+    def _get_trips(self):
+        return io.read_file(path=io.with_format(os.path.join(self._datapath, 'processed/{}_trips'.format(self._prettyfilename))),
+                            datetime_cols=['start_time', 'end_time'], schema='trips')
 
+    @profiling.profiled
     def prepWeather(self):
 
-        if self._intermediateexists('weather') and not self._refresh:
-            print('Weather data was already fetched for this dataset. Skipping...')
-            print('If you want to force re-run of preprocessing and transformation, provide the -r/--refresh option.\n')
+        if not self._runs('prepWeather'):
+            print('Weather data is available in the local weather store. Skipping...')
+            print('If you want to fetch updates from DWD, provide the -r/--refresh option.\n')
             return
 
-        print('Fetching and processing weather data from DWD...')
-
-        path = os.path.join(self._datapath, 'external/')
+        if self._refresh:
+            self._weather.update()
+        else:
+            self._weather.prepare()
 
-        urls = {
-            'air_temp': 'https://opendata.dwd.de/climate_environment/CDC/observations_germany/climate/10_minutes/air_temperature/historical/10minutenwerte_TU_00691_20100101_20191231_hist.zip',
-            'air_temp_extr': 'https://opendata.dwd.de/climate_environment/CDC/observations_germany/climate/10_minutes/extreme_temperature/historical/10minutenwerte_extrema_temp_00691_20100101_20191231_hist.zip',
-            'wind': 'https://opendata.dwd.de/climate_environment/CDC/observations_germany/climate/10_minutes/wind/historical/10minutenwerte_wind_00691_20100101_20191231_hist.zip',
-            'wind_extr': 'https://opendata.dwd.de/climate_environment/CDC/observations_germany/climate/10_minutes/extreme_wind/historical/10minutenwerte_extrema_wind_00691_20100101_20191231_hist.zip',
-            'precipitation': 'https://opendata.dwd.de/climate_environment/CDC/observations_germany/climate/10_minutes/precipitation/historical/10minutenwerte_nieder_00691_20100101_20191231_hist.zip'
-        }
-
-        air_temp = self._getDwdData(urls['air_temp'], path, 'air_temp.zip')
-
-        air_temp_extr = self._getDwdData(
-            urls['air_temp_extr'], path, 'air_temp_extr.zip')
-
-        wind = self._getDwdData(urls['wind'], path, 'wind.zip')
-
-        wind_extr = self._getDwdData(urls['wind_extr'], path, 'wind_extr.zip')
-
-        precipitation = self._getDwdData(
-            urls['precipitation'], path, 'precipitation.zip')
-
-        print('Cleaning air_temp...')
-
-        air_temp = self._filterForYears(air_temp)
-
-        # Drop unnecessary columns
-        air_temp.drop(columns={'STATIONS_ID', '  QN',
-                               'PP_10', 'eor'}, inplace=True)
-
-        # Assign interpretable column names
-        air_temp.rename(columns={"TT_10": "temp_2m", "TM5_10": "temp_5cm",
-                                 "RF_10": "humidity_2m", "TD_10": "dew_point_2m"}, inplace=True)
-        air_temp.drop(columns={'temp_5cm'}, inplace=True)
-
-        air_temp.replace(-999, float('NaN'), inplace=True)
-        air_temp.dropna(inplace=True)
-
-        print('Cleaning air_temp_extr...')
-
-        air_temp_extr = self._filterForYears(air_temp_extr)
-
-        # Drop unnecessary columns
-        air_temp_extr.drop(
-            columns=['STATIONS_ID', '  QN', 'eor'], inplace=True)
-
-        # Assign interpretable column names
-
-        air_temp_extr.rename(columns={'TX_10': 'max_at_2m', 'TX5_10': 'max_at_5cm',
-                                      'TN_10': 'min_at_2m', 'TN5_10': 'min_at_5cm'}, inplace=True)
-        air_temp_extr.drop(columns={'min_at_2m', 'min_at_5cm'}, inplace=True)
-        air_temp_extr.drop(columns={'max_at_5cm'}, inplace=True)
-
-        air_temp_extr.replace(-999, float('NaN'), inplace=True)
-        air_temp_extr.dropna(inplace=True)
-
-        print('Cleaning wind...')
-
-        wind = self._filterForYears(wind)
-
-        # Drop unnecessary columns
-        wind.drop(columns={'STATIONS_ID', '  QN', 'eor'}, inplace=True)
-
-        # Assign interpretable column names
-        wind.rename(columns={'FF_10': 'mean_speed_h/s',
-                             'DD_10': 'direction_degree'}, inplace=True)
-
-        wind.replace(-999, float('NaN'), inplace=True)
-        wind.dropna(inplace=True)
-
-        print('Cleaning wind_extr...')
-
-        wind_extr = self._filterForYears(wind_extr)
-
-        # Drop unnecessary columns
-        wind_extr.drop(columns={'STATIONS_ID', '  QN', 'eor'}, inplace=True)
-
-        # Assign interpretable column names
-        wind_extr.rename(columns={'FX_10': 'max_m/s', 'FNX_10': 'min_mean_m/s',
-                                  'FMX_10': 'max_mean_m/s', 'DX_10': 'direction_degree'}, inplace=True)
-
-        wind_extr.replace(-999, float('NaN'), inplace=True)
-        wind_extr.dropna(inplace=True)
+    def _get_weather(self):
+        return self._weather.load()
 
-        print('Cleaning precipitation...')
+    @profiling.profiled
+    def mergeWeatherTrips(self, trips, weather):
 
-        precipitation = self._filterForYears(precipitation)
+        if not self._runs('mergeWeatherTrips'):
+            print('A processed version of the dataset {} exists. Skipping...'.format(
+                self._filename))
+            print('If you want to force re-run of preprocessing and transformation, provide the -r/--refresh option.\n')
+            return
 
-        # Drop unnecessary columns
-        precipitation.drop(
-            columns={'STATIONS_ID', '  QN', 'eor', 'RWS_IND_10'}, inplace=True)
+        with profiling.span('merge_weather', rows_in=len(trips)) as span:
+            data = self._merge_weather(trips, weather)
+            span.rows_out = len(data)
 
-        # Assign interpretable column names
-        precipitation.rename(
-            columns={'RWS_DAU_10': 'min', 'RWS_10': 'mm'}, inplace=True)
+        # save to /data/processed
+        io.save_df(data, self._filename)
+        print('Done with preprocessing and transformation!')
 
-        precipitation.replace(-999, float('NaN'), inplace=True)
-        precipitation.dropna(inplace=True)
+    def _merge_weather(self, trips, weather):
 
-        print('Merging all weather data...')
+        weather = weather.drop(columns=['mm'])
+        weather['timestamp'] = pd.to_datetime(weather['timestamp'])
+        if not weather['timestamp'].is_monotonic_increasing:
+            weather = weather.sort_values('timestamp')
 
-        all_weather = pd.merge(air_temp, air_temp_extr, on='timestamp')
+        # Attach the latest weather observation before start and end of each trip, if it is recent enough
+        del trips['bike_type']
+        attach_weather(trips, weather, 'start_time', self._weather_tolerance)
+        attach_weather(trips, weather, 'end_time', self._weather_tolerance, prefix='end_')
+        print("Trip and weather data merged")
+        print("Clean data...")
+        trips.dropna(subset=weather.columns.drop('timestamp'), inplace=True)
 
-        all_weather = pd.merge(all_weather, wind, on='timestamp')
+        return trips
 
-        all_weather = pd.merge(all_weather, wind_extr, on='timestamp')
+    def run(self):
+        """
+        Runs all stages whose output does not exist yet (all with refresh), following the plan printed up front. Each
+        stage hands its output to the next one in memory, the intermediate datasets are only read if their stage was
+        skipped. Without checkpoints, they are not written either. Inputs are only loaded by the stages that run, so a
+        run with all outputs in place reads nothing.
+        """
+        plan = self.plan()
+        print('Stages for {}: {}'.format(self._filename, ', '.join(
+            '{} ({})'.format(stage, 'run' if runs else 'skip') for stage, runs in plan.items())))
+        if not all(plan.values()):
+            print('Stages are skipped if their output exists. If you want to force re-run of preprocessing and '
+                  'transformation, provide the -r/--refresh option.\n')
+
+        if plan['clean_dataset']:
+            self.clean_dataset()
+        if plan['create_trips']:
+            self.create_trips()
+        # the pings are not needed anymore
+        self._raw = self._cleaned = None
+        if plan['prepWeather']:
+            self.prepWeather()
+        if not plan['mergeWeatherTrips']:
+            print('A processed version of the dataset {} exists.'.format(self._filename))
+            return
 
-        all_weather = pd.merge(all_weather, precipitation, on='timestamp')
+        trips = self._trips
+        if trips is None:
+            with profiling.span('load_trips'):
+                trips = self._get_trips()
+        with profiling.span('load_weather'):
+            weather = self._get_weather()
+        self.mergeWeatherTrips(trips, weather)
 
-        all_weather.to_csv(path + self._prettyfilename +
-                           '_weather.gz', compression='gzip')
+    def _get_state(self, target):
+        """
+        Returns the state of former runs of the processed dataset target: the last cleaned ping of every bike and the
+        number of round trips per day. If no state was saved yet, it is derived from the intermediate datasets.
+        """
+        lastpingspath = io.with_format(os.path.join(self._datapath, 'processed', target + '_lastpings'))
+        roundtripspath = io.with_format(os.path.join(self._datapath, 'processed', target + '_roundtrips'))
+
+        if os.path.isfile(lastpingspath) and os.path.isfile(roundtripspath):
+            lastpings = io.read_file(path=lastpingspath, datetime_cols=['datetime'])
+            roundtrips = io.read_file(path=roundtripspath, datetime_cols=['day'])
+            return lastpings, roundtrips.set_index('day')['count'].asfreq('D', fill_value=0)
+
+        print('No state of former runs found, deriving it from the intermediate datasets of {}...'.format(target))
+        cleaned = io.read_file(path=io.with_format(os.path.join(self._datapath, 'processed', target + '_cleaned')),
+                               datetime_cols=['datetime'], schema='pings')
+        lastpings = cleaned.sort_values(['b_number', 'datetime']).groupby('b_number').tail(1)
+
+        trips = io.read_file(path=io.with_format(os.path.join(self._datapath, 'processed', target + '_trips')),
+                             datetime_cols=['start_time', 'end_time'], schema='trips')
+        roundtrips = trips[(trips['start_lng'] == trips['end_lng']) & (
+            trips['start_lat'] == trips['end_lat'])].resample('D', on='start_time')['bike'].count()
+
+        return lastpings, roundtrips
+
+    def _save_state(self, target, lastpings, roundtrips):
+        io.save_df(lastpings, target + '_lastpings')
+        io.save_df(roundtrips.rename_axis('day').rename('count').reset_index(), target + '_roundtrips')
+
+    @profiling.profiled
+    def append_to(self, target):
+        """
+        Incrementally transforms the raw pings of this Preprocessor and appends them to the processed dataset target,
+        e.g. a new daily delivery to bremen.csv, which has to be transformed completely once before.
+
+        Only pings newer than the last ping of their bike in former runs (the per bike high-water mark) are processed.
+        Trip building only ever pairs a ping with its predecessor of the same bike, so keeping the last ping of every
+        bike carries all open trips (e.g. a start ping without end ping yet) over to the next run. The new cleaned
+        pings, trips and trips merged with weather data are appended to the intermediate and processed datasets.
+
+        Trip filters work on the new trips only, except for the anomalous-day filter, which uses the round trips per
+        day of all runs; days of former runs are not re-filtered. A demand cube of the target is updated with the new
+        trips.
+        """
+        target = target.replace('.csv', '')
+
+        if not self._intermediateexists_for(target, 'cleaned') or not self._intermediateexists_for(target, 'trips'):
+            print('The dataset {} has not been transformed completely yet - please run "nextbike transform" on it '
+                  'first.'.format(target))
+            return
 
-        print('Getting and cleaning of weather data successful!')
-        print('Weather Data saved as ' + path +
-              '{}_weather.gz'.format(self._prettyfilename))
-        print('\nTo import the data use the following command:')
-        print("pd.read_csv(path + 'external/{}_weather.gz', index_col='timestamp')".format(self._prettyfilename))
+        lastpings, roundtrips = self._get_state(target)
 
-    def _get_weather(self):
-        return pd.read_csv(os.path.join(self._datapath, 'external/{}_weather.gz'.format(self._prettyfilename)))
+        print('Cleaning new pings...')
+        pings = self._clean_chunk(self._get_raw())
+        pings = pings[~pings.duplicated(subset=['datetime', 'b_number'], keep='first')]
 
-    def mergeWeatherTrips(self, trips, weather):
+        # Drop all pings at or before the high-water mark of their bike
+        highwatermark = pings['b_number'].map(lastpings.set_index('b_number')['datetime'])
+        pings = pings[~(pings['datetime'] <= highwatermark)].sort_values('datetime')
+        print(len(pings), 'new pings.')
 
-        if self._intermediateexists('final') and not self._refresh:
-            print('A processed version of the dataset {} exists. Skipping...'.format(
-                self._filename))
-            print('If you want to force re-run of preprocessing and transformation, provide the -r/--refresh option.\n')
+        if pings.empty:
+            print('Nothing to append.')
             return
 
-        weather['timestamp'] = pd.to_datetime(weather['timestamp'])
+        # Pair the new pings with the last ping of their bike from former runs
+        pending = pd.concat([lastpings[pings.columns], pings], ignore_index=True)
+        trips = io.apply_schema(build_trips_parallel(pending, self._workers), 'trips')
+        print('created', len(trips), 'trips.')
+        trips, roundtrips = self._filter_trips(trips, roundtrips)
 
-        # Floor start time to next 10 minutes so we can merge it with weather data
+        data = self._merge_weather(trips.copy(), self._get_weather())
 
-        trips['sTime_floored'] = pd.to_datetime(
-            trips['start_time']).dt.floor('10T')
-        trips['sTime_floored'] = pd.to_datetime(trips['sTime_floored'])
-        data = trips.merge(right=weather, left_on='sTime_floored',
-                           right_on='timestamp', how='left')
-        data.drop(columns=['sTime_floored'], inplace=True)
-        print("Trip and weather data merged")
-        print("Clean data...")
-        data.drop(columns=["bike_type", "mm", "timestamp"], inplace=True)
-        data.dropna(inplace=True)
+        io.append_df(pings, target + '_cleaned')
+        io.append_df(trips, target + '_trips')
+        io.append_df(data, target)
 
-        # save to /data/processed
-        io.save_df(data, self._filename)
-        print('Done with preprocessing and transformation!')
+        # The demand cube of the target is updated after the target, so it stays at least as recent.
+        cube = DemandCube.get_path(os.path.join(self._datapath, 'processed', target))
+        if os.path.isfile(io.find_dataset(cube)):
+            DemandCube.load(io.find_dataset(cube)).update(data).save(io.find_dataset(cube))
+            print('Demand cube updated.')
 
-    def run(self):
-        self.clean_dataset()
-        self.create_trips()
-        self.prepWeather()
-        trips = self._get_trips()
-        weather = self._get_weather()
-        self.mergeWeatherTrips(trips, weather)
+        lastpings = pending.sort_values(['b_number', 'datetime']).groupby('b_number').tail(1)
+        self._save_state(target, lastpings, roundtrips)
+        print('Appended {} trips to {}.'.format(len(data), target))
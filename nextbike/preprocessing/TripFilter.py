@@ -0,0 +1,106 @@
+from .. import profiling
+import numpy as np
+import pandas as pd
+
+_NS_PER_DAY = 24 * 60 * 60 * 10 ** 9
+
+
+class TripFilter:
+    """
+    Drops implausible trips in a single pass over the trips.
+
+    The keys the rules share (round trip, start and end time as integers, start day as integer) are computed once. The
+    rules are evaluated in the order of `rules` on a common mask of remaining trips, and the frame is only copied once
+    at the end. A rule sees the trips that remain after the rules before it, like sequential filters would. The number
+    of trips each rule dropped is kept in `dropped`.
+    """
+
+    # rule name -> description, in the order the rules are evaluated
+    rules = {
+        'over_24h': 'trips with a duration of 24h or more',
+        'free_round_trips': 'round trips that are not station-bound',
+        'short_round_trips': 'round trips of 7 minutes or less',
+        'anomalous_days': 'round trips on days with 3 standard deviations more round trips than the median',
+        'duplicate_times': 'trips starting at the time of 2 to 9 trips with the same start and end time'
+    }
+
+    def __init__(self, max_duration=24 * 60 * 60, short_round_trip=7 * 60, deviations=3, max_duplicates=10):
+        self.max_duration = max_duration
+        self.short_round_trip = short_round_trip
+        self.deviations = deviations
+        self.max_duplicates = max_duplicates
+        self.dropped = {}
+        self.tripsperday = None
+
+    def apply(self, trips, history=None):
+        """
+        Returns the remaining trips, with missing values filled with zeros, and the number of round trips per day.
+        history optionally holds the number of round trips per day of former runs, which is taken into account for
+        the anomalous-day filter.
+        """
+        self._history = history
+        self._trips = trips
+        self.keys = {
+            'duration': trips['duration_sec'].to_numpy(),
+            'round': ((trips['start_lng'].to_numpy() == trips['end_lng'].to_numpy()) &
+                      (trips['start_lat'].to_numpy() == trips['end_lat'].to_numpy())),
+            'start': trips['start_time'].to_numpy().view('i8'),
+            'end': trips['end_time'].to_numpy().view('i8')
+        }
+        self.keys['day'] = self.keys['start'] // _NS_PER_DAY
+
+        keep = np.ones(len(trips), dtype=bool)
+        self.dropped = {}
+        for rule in self.rules:
+            remaining = int(keep.sum())
+            with profiling.span(rule, rows_in=remaining) as span:
+                keep &= ~getattr(self, '_' + rule)(keep)
+                self.dropped[rule] = remaining - int(keep.sum())
+                span.rows_out = remaining - self.dropped[rule]
+
+        trips = trips[keep].fillna(0)
+        del self._trips, self._history, self.keys
+        return trips, self.tripsperday
+
+    # Every rule returns the mask of trips it drops, given the mask of trips remaining after the rules before it.
+
+    def _over_24h(self, keep):
+        return self.keys['duration'] >= self.max_duration
+
+    def _free_round_trips(self, keep):
+        return self.keys['round'] & (self._trips['start_place'].to_numpy() == 0) & \
+            (self._trips['end_place'].to_numpy() == 0)
+
+    def _short_round_trips(self, keep):
+        return self.keys['round'] & (self.keys['duration'] <= self.short_round_trip)
+
+    def _anomalous_days(self, keep):
+        # Round trips per day between the first and the last day with round trips, days without are counted as 0.
+        days = self.keys['day'][keep & self.keys['round']]
+        first = days.min() if len(days) else 0
+        counts = np.bincount(days - first) if len(days) else np.zeros(0, dtype=np.int64)
+        tripsperday = pd.Series(counts, name='bike', index=pd.DatetimeIndex(
+            (first + np.arange(len(counts))) * _NS_PER_DAY, freq='D' if len(counts) else None, name='start_time'))
+        if self._history is not None:
+            # add the round trips of former runs, so the cutoff reflects all days seen so far
+            tripsperday = tripsperday.add(self._history, fill_value=0).asfreq('D', fill_value=0)
+        self.tripsperday = tripsperday
+
+        cutoff = tripsperday.std() * self.deviations
+        dropdays = tripsperday.index[tripsperday > tripsperday.median() + cutoff].to_numpy().view('i8') // _NS_PER_DAY
+        return self.keys['round'] & np.isin(self.keys['day'], dropdays)
+
+    def _duplicate_times(self, keep):
+        # Groups of remaining trips with equal start and end time, found by sorting both as integers.
+        start = self.keys['start'][keep]
+        end = self.keys['end'][keep]
+        order = np.lexsort((end, start))
+        start, end = start[order], end[order]
+        first = np.ones(len(start), dtype=bool)
+        first[1:] = (start[1:] != start[:-1]) | (end[1:] != end[:-1])
+        bounds = np.flatnonzero(np.append(first, True))
+        sizes = np.diff(bounds)
+
+        # every trip starting at the start time of a small group of duplicates is dropped
+        droptimes = start[bounds[:-1][(sizes > 1) & (sizes < self.max_duplicates)]]
+        return np.isin(self.keys['start'], droptimes)
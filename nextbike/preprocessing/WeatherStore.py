@@ -0,0 +1,184 @@
+from .. import io
+import hashlib
+import json
+import os
+import pandas as pd
+from nextbike.io import get_data_path
+
+
+class WeatherStore:
+    """
+    Local store of the 10-minute DWD weather observations of station 00691 (Bremen), shared by all datasets.
+
+    The store lives in data/external/weather/. Downloaded source archives are cached content-addressed by their SHA-256
+    hash under archives/ and sources.json records which archive is current for each source. The cleaned and merged
+    observations are kept as one table sorted by timestamp in the configured storage format.
+
+    Without network access, the table is seeded from the weather data shipped in data/external/bremen_weather.gz.
+    """
+
+    _base_url = 'https://opendata.dwd.de/climate_environment/CDC/observations_germany/climate/10_minutes/'
+
+    # Per source: URL, columns to drop and interpretable names of the remaining columns.
+    _sources = {
+        'air_temp': (_base_url + 'air_temperature/historical/10minutenwerte_TU_00691_20100101_20191231_hist.zip',
+                     ['STATIONS_ID', '  QN', 'PP_10', 'TM5_10', 'eor'],
+                     {'TT_10': 'temp_2m', 'RF_10': 'humidity_2m', 'TD_10': 'dew_point_2m'}),
+        'air_temp_extr': (_base_url + 'extreme_temperature/historical/'
+                                      '10minutenwerte_extrema_temp_00691_20100101_20191231_hist.zip',
+                          ['STATIONS_ID', '  QN', 'TX5_10', 'TN_10', 'TN5_10', 'eor'],
+                          {'TX_10': 'max_at_2m'}),
+        'wind': (_base_url + 'wind/historical/10minutenwerte_wind_00691_20100101_20191231_hist.zip',
+                 ['STATIONS_ID', '  QN', 'eor'],
+                 {'FF_10': 'mean_speed_h/s', 'DD_10': 'direction_degree_x'}),
+        'wind_extr': (_base_url + 'extreme_wind/historical/10minutenwerte_extrema_wind_00691_20100101_20191231_hist.zip',
+                      ['STATIONS_ID', '  QN', 'eor'],
+                      {'FX_10': 'max_m/s', 'FNX_10': 'min_mean_m/s', 'FMX_10': 'max_mean_m/s',
+                       'DX_10': 'direction_degree_y'}),
+        'precipitation': (_base_url + 'precipitation/historical/10minutenwerte_nieder_00691_20100101_20191231_hist.zip',
+                          ['STATIONS_ID', '  QN', 'eor', 'RWS_IND_10'],
+                          {'RWS_DAU_10': 'min', 'RWS_10': 'mm'})
+    }
+
+    def __init__(self, datapath=None):
+        self._datapath = datapath or get_data_path()
+        self._path = os.path.join(self._datapath, 'external', 'weather')
+        self._archivepath = os.path.join(self._path, 'archives')
+        self._indexpath = os.path.join(self._path, 'sources.json')
+        self._tablepath = os.path.join(self._path, 'weather')
+
+    def _get_index(self):
+        if not os.path.isfile(self._indexpath):
+            return {}
+        with open(self._indexpath) as f:
+            return json.load(f)
+
+    def _save_index(self, index):
+        with open(self._indexpath, 'w') as f:
+            json.dump(index, f, indent=2, sort_keys=True)
+
+    def _get_archive(self, digest):
+        return os.path.join(self._archivepath, digest + '.zip')
+
+    def _download(self, name, url):
+        """Downloads a source archive in blocks into the cache and returns its SHA-256 hash."""
+        import requests
+        os.makedirs(self._archivepath, exist_ok=True)
+        digest = hashlib.sha256()
+        partial = os.path.join(self._archivepath, name + '.part')
+
+        with requests.get(url, stream=True, timeout=60) as response:
+            response.raise_for_status()
+            with open(partial, 'wb') as f:
+                for block in response.iter_content(chunk_size=1 << 20):
+                    digest.update(block)
+                    f.write(block)
+
+        digest = digest.hexdigest()
+        if os.path.isfile(self._get_archive(digest)):
+            os.remove(partial)
+        else:
+            os.replace(partial, self._get_archive(digest))
+        return digest
+
+    def _read_source(self, name, digest):
+        _, drop, names = self._sources[name]
+        df = pd.read_csv(self._get_archive(digest), sep=';')
+
+        df.rename(columns={"MESS_DATUM": "timestamp"}, inplace=True)
+        df['timestamp'] = pd.to_datetime(df['timestamp'].astype(str))
+        df.set_index('timestamp', inplace=True)
+        df = df[df.index.year >= 2018]
+
+        df = df.drop(columns=drop).rename(columns=names)
+        df = df.replace(-999, float('NaN')).dropna()
+        return df
+
+    def _build_from_archives(self, index):
+        print('Cleaning and merging weather data...')
+        sources = [self._read_source(name, index[name]) for name in self._sources]
+
+        # all sources share the 10-minute timestamps, so they are joined in one pass
+        weather = pd.concat(sources, axis=1, join='inner').sort_index()
+        return weather.rename_axis('timestamp').reset_index()
+
+    def _seed(self):
+        path = os.path.join(self._datapath, 'external', 'bremen_weather.gz')
+        print('Seeding the weather store from {}...'.format(path))
+        return pd.read_csv(path, parse_dates=['timestamp']).sort_values('timestamp')
+
+    def _save_table(self, weather):
+        os.makedirs(self._path, exist_ok=True)
+        io.write_frame(weather, io.with_format(self._tablepath))
+
+    def exists(self):
+        return os.path.isfile(io.find_dataset(self._tablepath))
+
+    def update(self):
+        """
+        Fetches the source archives from DWD. Archives whose content did not change are not processed again, of
+        changed archives only observations newer than the stored ones are appended to the table. Without network
+        access the cached archives or, as a last resort, the shipped weather data are used.
+        """
+        import requests
+        index = self._get_index()
+        updated = dict(index)
+
+        print('Fetching weather data from DWD...')
+        for name, (url, _, _) in self._sources.items():
+            try:
+                updated[name] = self._download(name, url)
+            except requests.exceptions.RequestException as e:
+                print('Could not fetch {} ({}), using the cached version if available.'.format(name, e))
+
+        os.makedirs(self._path, exist_ok=True)
+        if updated == index and self.exists():
+            print('Weather data is up to date.')
+            return
+
+        if all(name in updated for name in self._sources):
+            weather = self._build_from_archives(updated)
+        elif not self.exists():
+            weather = self._seed()
+        else:
+            print('Weather data is incomplete without network access, keeping the stored table.')
+            return
+
+        if self.exists():
+            stored = self.load()
+            weather = pd.concat([stored, weather[weather['timestamp'] > stored['timestamp'].max()]],
+                                ignore_index=True)
+            print('{} new weather observations.'.format(len(weather) - len(stored)))
+
+        self._save_table(weather)
+        self._save_index(updated)
+        print('Weather data saved in', self._path)
+
+    def prepare(self):
+        """Makes sure the table exists, building it from cached archives or the shipped weather data."""
+        if self.exists():
+            return
+
+        index = self._get_index()
+        if all(name in index and os.path.isfile(self._get_archive(index[name])) for name in self._sources):
+            self._save_table(self._build_from_archives(index))
+        else:
+            self._save_table(self._seed())
+
+    def load(self, start=None, end=None, columns=None):
+        """
+        Returns the weather observations with a timestamp column, optionally restricted to [start, end] and a list of
+        columns.
+        """
+        self.prepare()
+        if columns is not None and 'timestamp' not in columns:
+            columns = ['timestamp'] + list(columns)
+        weather = io.read_file(path=io.find_dataset(self._tablepath), datetime_cols=['timestamp'], columns=columns)
+
+        if start is not None or end is not None:
+            # the table is sorted by timestamp, so the range is found by binary search
+            timestamps = weather['timestamp']
+            first = 0 if start is None else timestamps.searchsorted(pd.Timestamp(start), side='left')
+            last = len(weather) if end is None else timestamps.searchsorted(pd.Timestamp(end), side='right')
+            weather = weather.iloc[first:last].reset_index(drop=True)
+        return weather
@@ -0,0 +1,160 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import numpy as np
+import pandas as pd
+
+
+# Time of day of the checkout/checkin pings nextbike emits around midnight for bikes that did not move.
+_LAST_PING = pd.Timedelta(hours=23, minutes=59)
+_FIRST_PING = pd.Timedelta(0)
+
+
+def build_trips(pings):
+    """
+    Pairs consecutive pings of each bike into trips.
+
+    Pings are ordered by bike number and timestamp, so every ping is compared with its predecessor in one vectorized
+    pass. A trip is written for each pair of pings of the same bike that is either
+
+    * a 'start' ping followed by an 'end' ping, or
+    * a 'last' ping followed by a 'first' ping, unless one of them is a midnight checkout/checkin ping (23:59/00:00)
+      or the bike has not moved.
+
+    Returns a DataFrame with one row per trip, ordered by bike and start time. Pings already in this order, like the
+    cleaned pings, are not sorted again.
+    """
+    ordered = pings if _is_ordered(pings) else pings.sort_values(['b_number', 'datetime'], axis=0)
+
+    bike = ordered['b_number'].to_numpy()
+    trip = ordered['trip']
+    time = ordered['datetime']
+    lat = ordered['p_lat'].to_numpy()
+    lng = ordered['p_lng'].to_numpy()
+
+    # Time of day for the midnight rule.
+    time_of_day = (time - time.dt.floor('D')).to_numpy()
+
+    # Compare each ping (end) with the ping before it (start).
+    same_bike = bike[1:] == bike[:-1]
+    # compared as Series, so categorical trip types are compared by their codes
+    start_end = (trip == 'start').to_numpy()[:-1] & (trip == 'end').to_numpy()[1:]
+    last_first = (trip == 'last').to_numpy()[:-1] & (trip == 'first').to_numpy()[1:]
+    not_midnight = (time_of_day[:-1] != _LAST_PING.to_timedelta64()) & \
+                   (time_of_day[1:] != _FIRST_PING.to_timedelta64())
+    moved = (lat[1:] != lat[:-1]) | (lng[1:] != lng[:-1])
+
+    start = np.flatnonzero(same_bike & (start_end | (last_first & not_midnight & moved)))
+    end = start + 1
+
+    start_time = time.iloc[start].reset_index(drop=True)
+    end_time = time.iloc[end].reset_index(drop=True)
+
+    # columns keep their dtype, e.g. categoricals and nullable postcodes
+    def column(name, rows):
+        return ordered[name].array.take(rows)
+
+    return pd.DataFrame({
+        'bike': bike[end],
+        'bike_type': column('b_bike_type', end),
+        'identification': column('p_uid', end),
+        'start_time': start_time,
+        'end_time': end_time,
+        'weekend': (start_time.dt.weekday >= 5).astype('int64'),
+        'duration_sec': (end_time - start_time).dt.total_seconds(),
+        'start_lng': lng[start],
+        'start_lat': lat[start],
+        'end_lng': lng[end],
+        'end_lat': lat[end],
+        'start_place': column('p_number', start),
+        'end_place': column('p_number', end),
+        'start_plz': column('plz', start),
+        'end_plz': column('plz', end)
+    })
+
+
+def _is_ordered(pings):
+    """Returns whether pings are ordered by bike number and timestamp, in one pass."""
+    bike = pings['b_number'].to_numpy()
+    time = pings['datetime'].to_numpy()
+    same_bike = bike[1:] == bike[:-1]
+    return bool((bike[1:] >= bike[:-1]).all() and (time[1:][same_bike] >= time[:-1][same_bike]).all())
+
+
+def build_trips_parallel(pings, workers):
+    """
+    Builds trips like build_trips, but divided among the given number of processes.
+
+    Trips never span two bikes, so the pings, ordered by bike number and timestamp, are cut at bike boundaries into one
+    contiguous range of rows per process. This process builds the first range, worker processes build the others.
+    Where processes are forked (Linux), the workers inherit the pings and only receive the bounds of their range, so
+    no pings are copied between processes. The ranges are in the order build_trips returns, hence their trips are
+    concatenated without sorting and the result is identical to the single-process run.
+
+    Parallel building pays off for millions of pings with a free CPU per process. On fewer CPUs or for small
+    datasets, starting the workers and sending their trips back costs more than it saves.
+    """
+    if workers <= 1 or pings.empty:
+        return build_trips(pings)
+
+    global _pings
+    ordered = pings if _is_ordered(pings) else pings.sort_values(['b_number', 'datetime'], axis=0)
+    bounds = _bike_bounds(ordered['b_number'].to_numpy(), workers)
+    ranges = list(zip(bounds[:-1], bounds[1:]))
+    if len(ranges) == 1:
+        return build_trips(ordered)
+
+    inherited = multiprocessing.get_start_method() == 'fork'
+    _pings = ordered if inherited else None
+    try:
+        with ProcessPoolExecutor(max_workers=len(ranges) - 1) as executor:
+            if inherited:
+                futures = [executor.submit(_build_range, start, end) for start, end in ranges[1:]]
+            else:
+                futures = [executor.submit(build_trips, ordered.iloc[start:end]) for start, end in ranges[1:]]
+            # the first range is built by this process while the workers build the others
+            results = [build_trips(ordered.iloc[slice(*ranges[0])])] + [future.result() for future in futures]
+    finally:
+        _pings = None
+
+    return pd.concat([result for result in results if len(result)] or results[:1], ignore_index=True)
+
+
+# Pings of build_trips_parallel, which forked workers inherit.
+_pings = None
+
+
+def _build_range(start, end):
+    return build_trips(_pings.iloc[start:end])
+
+
+def _bike_bounds(bike, parts):
+    """
+    Returns the row bounds that cut the ordered bike numbers into at most the given number of ranges of about equal
+    size, each starting at the first ping of a bike.
+    """
+    targets = np.linspace(0, len(bike), parts + 1).astype(np.intp)[1:-1]
+    # move every cut back to the first ping of the bike it falls into
+    cuts = np.searchsorted(bike, bike[targets], side='left')
+    return np.unique(np.concatenate([[0], cuts, [len(bike)]]))
+
+
+def attach_weather(trips, weather, time_column, tolerance, prefix=''):
+    """
+    As-of join of weather observations onto trips, in place.
+
+    Every trip gets the latest observation at or before its time_column, if that observation is at most tolerance
+    older, else NaN. weather has to be sorted by its timestamp column, so the observations are found by binary search
+    on the timestamp array, independent of the order of the trips. Weather columns are added with the given prefix.
+    """
+    timestamps = weather['timestamp'].to_numpy()
+    times = trips[time_column].to_numpy()
+
+    position = np.searchsorted(timestamps, times, side='right') - 1
+    found = position >= 0
+    found[found] = (times[found] - timestamps[position[found]]) <= pd.Timedelta(tolerance).to_timedelta64()
+    position = position.clip(0)
+
+    for col in weather.columns.drop('timestamp'):
+        values = weather[col].to_numpy()[position]
+        trips[prefix + col] = values if found.all() else np.where(found, values, np.nan)
+    return trips
@@ -0,0 +1,199 @@
+import functools
+import json
+import os
+import sys
+import time
+
+# Spans of the current process, recorded only after enable().
+_enabled = False
+_cprofile = None
+_spans = []
+_stack = []
+_started = None
+
+
+def enable(cprofile=None):
+    """
+    Starts recording a span for every pipeline stage. With cprofile, a directory, every outermost span is additionally
+    profiled by cProfile and dumped to <cprofile>/<number>-<stage>.prof.
+    """
+    global _enabled, _cprofile, _started
+    _enabled = True
+    _cprofile = cprofile
+    _started = time.perf_counter()
+    if cprofile is not None:
+        os.makedirs(cprofile, exist_ok=True)
+
+
+def enabled():
+    return _enabled
+
+
+def span(name, rows_in=None):
+    """
+    Returns a context manager that records wall time, memory and rows of the stage name, nested in the enclosing span.
+    The number of rows the stage produced is set on the returned span as rows_out. Costs nothing if not enabled.
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, rows_in)
+
+
+def profiled(function):
+    """Decorator recording a span named after the function for every call."""
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with span(function.__name__):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+class _Span:
+
+    def __init__(self, name, rows_in):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+
+    def __enter__(self):
+        self.parent = _stack[-1] if _stack else None
+        self.path = self.parent.path + '/' + self.name if self.parent else self.name
+        if self.parent is not None:
+            # the peak is reset for this span, so the peak of the parent so far is kept first
+            self.parent.peak = max(self.parent.peak, _peak_rss())
+        _reset_peak_rss()
+        self.rss = _rss()
+        self.peak = self.rss
+        _stack.append(self)
+
+        self.profile = None
+        if _cprofile is not None and self.parent is None:
+            import cProfile
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        if self.profile is not None:
+            self.profile.disable()
+            self.profile.dump_stats(os.path.join(_cprofile, '{:03d}-{}.prof'.format(len(_spans), self.name)))
+
+        _stack.pop()
+        self.peak = max(self.peak, _peak_rss())
+        if self.parent is not None:
+            self.parent.peak = max(self.parent.peak, self.peak)
+
+        rss = _rss()
+        _spans.append({
+            'name': self.name,
+            'path': self.path,
+            'depth': self.path.count('/'),
+            'start': self.start - _started,
+            'seconds': end - self.start,
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'rss_mb': _mb(rss),
+            'rss_delta_mb': _mb(rss - self.rss),
+            'peak_rss_mb': _mb(self.peak),
+            'failed': exc[0] is not None
+        })
+        return False
+
+
+class _NullSpan:
+
+    rows_in = None
+    rows_out = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def _mb(size):
+    return round(size / 2 ** 20, 1) if size is not None else None
+
+
+def _rss():
+    """Returns the resident memory of this process in bytes."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return _peak_rss()
+
+
+def _peak_rss():
+    """Returns the peak resident memory of this process in bytes, since the last reset if supported."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _reset_peak_rss():
+    """Resets the peak resident memory to the current one (Linux only), so the peak of each span can be measured."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def report():
+    """
+    Returns the recorded spans in the order they finished and a summary with the total time, calls and rows of each
+    stage path, e.g. transform/clean_dataset/dedup.
+    """
+    summary = {}
+    for s in _spans:
+        stage = summary.setdefault(s['path'], {'calls': 0, 'seconds': 0.0, 'rows_in': None, 'rows_out': None,
+                                              'peak_rss_mb': 0.0})
+        stage['calls'] += 1
+        stage['seconds'] += s['seconds']
+        stage['peak_rss_mb'] = max(stage['peak_rss_mb'], s['peak_rss_mb'])
+        for rows in ['rows_in', 'rows_out']:
+            if s[rows] is not None:
+                stage[rows] = (stage[rows] or 0) + s[rows]
+    return {'command': sys.argv, 'pid': os.getpid(), 'spans': _spans, 'summary': summary}
+
+
+def chrome_trace():
+    """Returns the recorded spans as Chrome trace events, to be opened in chrome://tracing or Perfetto."""
+    events = [{
+        'name': s['name'],
+        'cat': s['path'].split('/')[0],
+        'ph': 'X',
+        'ts': s['start'] * 1e6,
+        'dur': s['seconds'] * 1e6,
+        'pid': os.getpid(),
+        'tid': 0,
+        'args': {key: s[key] for key in ['path', 'rows_in', 'rows_out', 'rss_mb', 'rss_delta_mb', 'peak_rss_mb']}
+    } for s in _spans]
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def write(path, format='json'):
+    """Writes the recorded spans to path as report (json) or Chrome trace (chrome)."""
+    with open(path, 'w') as f:
+        json.dump(chrome_trace() if format == 'chrome' else report(), f, indent=1)
@@ -14,6 +14,10 @@ setuptools.setup(
     url="https://github.com/janiksudo/PDS_Project",
     packages=setuptools.find_packages(),
     install_requires=['pandas', 'scikit-learn', 'click', 'tqdm'],
+    extras_require={
+        'columnar': ['pyarrow'],
+        'compiled': ['numba']
+    },
     entry_points={
         'console_scripts': ['nextbike=nextbike.cli:cli']
     }